@@ -0,0 +1,315 @@
+"""
+Per-day ledger of Module 3 / Module 4 price actions.
+
+Module 3 and Module 4 each ran their own queries against
+``pricing_periodic_push`` / ``pricing_hourly_push`` on every run (today's
+previous actions, Module 4 increases, recent Module 3 increases, Module 4
+self-cooldown, daily step counts). ActionLedger loads the actions of both
+modules since LEDGER_LOOKBACK_HOURS before today's midnight with one query,
+keeps them as one columnar frame sorted by
+(product_id, warehouse_id, created_at) with a per-SKU index, and answers the
+cooldown / cap questions for the whole catalogue at once:
+
+    ledger.increases_since(2, module='module_3')            # M4: M3 cooldown
+    ledger.changes_since(1, module='module_4')              # M4: self-cooldown
+    ledger.step_counts(module='module_4', actions=M4_INCREASE_ACTIONS)
+
+Hour windows (``increases_since``, ``changes_since``, ``increases_in_last``)
+reach back across midnight like the queries they replace; daily counts
+(``step_counts``, ``steps_today``, ``frame``) only see today's rows.
+
+Per-SKU lookups (``sku_entries``, ``steps_today``, ``increases_in_last``,
+``last_change_time``) are one dict lookup into the index plus a slice.
+
+The Snowflake push tables stay the system of record: each module's existing
+bulk upload is the write path, and ``append()`` adds the same rows to the
+ledger. The ledger is mirrored to one Parquet file per Cairo day under
+``LEDGER_DIR``; ``refresh()`` pulls only rows newer than the newest local
+entry of each module (one UNION ALL query), so after the first run of the
+day the Snowflake read is a small delta.
+
+Timestamps are naive Cairo wall time (the modules write
+``datetime.now(CAIRO_TZ)``); tz-aware values are converted on the way in.
+
+Usage in notebooks:
+    import sys, os
+    sys.path.insert(0, os.path.abspath('..'))  # if running from modules/
+    from action_ledger import ActionLedger
+
+    ledger = ActionLedger.load()
+    ...
+    ledger.append(df_output, 'module_3')
+    ledger.save()
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+
+try:
+    import pyarrow  # noqa: F401  (Parquet mirror)
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+LEDGER_TIMEZONE = pytz.timezone('Africa/Cairo')
+LEDGER_DIR = os.environ.get(
+    'PRICING_LEDGER_DIR', os.path.join(tempfile.gettempdir(), 'pricing_action_ledger')
+)
+
+LEDGER_KEY_COLUMNS = ['product_id', 'warehouse_id']
+LEDGER_COLUMNS = LEDGER_KEY_COLUMNS + ['created_at', 'module', 'price_action', 'current_price', 'new_price']
+
+# Rows kept from before today's midnight, so hour windows (M3_COOLDOWN_HOURS,
+# the 1h Module 4 self-cooldown) still see yesterday evening's actions
+LEDGER_LOOKBACK_HOURS = 6
+
+# module -> push table it uploads to
+LEDGER_SOURCES = {
+    'module_3': 'MATERIALIZED_VIEWS.pricing_periodic_push',
+    'module_4': 'MATERIALIZED_VIEWS.pricing_hourly_push',
+}
+
+# Module 4 performance-based increases (count toward Module 3's daily cap)
+M4_INCREASE_ACTIONS = ('rets_growing', 'qty_growing_price_step', 'above_market_surge')
+# Module 4 growth steps limited by MAX_QTY_GROWING_PRICE_STEPS_PER_DAY
+M4_QTY_STEP_ACTIONS = ('qty_growing_price_step', 'above_market_surge')
+
+
+def cairo_now():
+    """Current Cairo wall time as a naive datetime (the ledger's clock)."""
+    return datetime.now(LEDGER_TIMEZONE).replace(tzinfo=None)
+
+
+def _to_cairo_naive(values):
+    ts = pd.to_datetime(pd.Series(values), errors='coerce')
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_convert(LEDGER_TIMEZONE).dt.tz_localize(None)
+    return ts.astype('datetime64[ns]')
+
+
+def _normalize(df, module=None):
+    """Project a module output / query result onto LEDGER_COLUMNS with fixed dtypes."""
+    df = df.rename(columns=str.lower)
+    out = pd.DataFrame(index=df.index)
+    for col in LEDGER_KEY_COLUMNS:
+        out[col] = pd.to_numeric(df[col], errors='coerce')
+    out['created_at'] = _to_cairo_naive(df['created_at']).to_numpy()
+    out['module'] = module if module is not None else df['module'].astype(str)
+    action = df['price_action'] if 'price_action' in df.columns else pd.Series('none', index=df.index)
+    out['price_action'] = action.fillna('none').astype(str)
+    for col in ['current_price', 'new_price']:
+        out[col] = pd.to_numeric(df[col], errors='coerce') if col in df.columns else np.nan
+    out = out.dropna(subset=LEDGER_KEY_COLUMNS + ['created_at'])
+    return out.astype({'product_id': 'int64', 'warehouse_id': 'int64'}).reset_index(drop=True)
+
+
+def _empty_entries():
+    return _normalize(pd.DataFrame(columns=LEDGER_COLUMNS))
+
+
+class ActionLedger:
+    """
+    Price actions of all modules for one Cairo day.
+
+    entries: DataFrame[LEDGER_COLUMNS] sorted by (product_id, warehouse_id, created_at)
+    day:     Cairo date the ledger covers; rows from ``window_start``
+             (LEDGER_LOOKBACK_HOURS before its midnight) on are kept too
+    """
+
+    def __init__(self, day=None, entries=None):
+        self.day = day or cairo_now().date()
+        self.midnight = datetime.combine(self.day, datetime.min.time())
+        self.window_start = self.midnight - timedelta(hours=LEDGER_LOOKBACK_HOURS)
+        self.window_end = self.midnight + timedelta(days=1)
+        self.entries = _empty_entries()
+        if entries is not None and len(entries) > 0:
+            self._add(_normalize(entries))
+        else:
+            self._reindex()
+
+    # ------------------------------------------------------------------
+    # Construction / persistence
+    # ------------------------------------------------------------------
+    @classmethod
+    def load(cls, day=None, refresh=True):
+        """Local mirror for ``day`` (if any), then one delta refresh from Snowflake."""
+        ledger = cls(day)
+        path = ledger.path
+        if ARROW_AVAILABLE and os.path.exists(path):
+            try:
+                ledger = cls(ledger.day, pd.read_parquet(path))
+            except (OSError, ValueError) as e:
+                print(f"  action ledger: could not read {path} ({e})")
+        if refresh:
+            ledger.refresh()
+        return ledger
+
+    @property
+    def path(self):
+        return os.path.join(LEDGER_DIR, f"action_ledger_{self.day.strftime('%Y%m%d')}.parquet")
+
+    def refresh(self):
+        """Pull rows newer than each module's newest entry (one query). Returns rows added."""
+        from db import query_snowflake
+
+        parts = []
+        for module, table in LEDGER_SOURCES.items():
+            where = f"created_at >= '{self.window_start}' AND created_at < '{self.window_end}'"
+            newest = self.newest(module)
+            if newest is not None:
+                where += f" AND created_at > '{newest}'"
+            parts.append(
+                f"SELECT product_id, warehouse_id, created_at, '{module}' AS module, "
+                f"price_action, current_price, new_price FROM {table} WHERE {where}"
+            )
+        added = self._add(_normalize(query_snowflake('\nUNION ALL\n'.join(parts))))
+        if added:
+            self.save()
+        return added
+
+    def append(self, df, module, created_at=None):
+        """Bulk-append one module run's output (e.g. df_output / df_action). Returns rows added."""
+        if len(df) == 0:
+            return 0
+        if created_at is not None or 'created_at' not in df.columns:
+            df = df.assign(created_at=created_at or cairo_now())
+        return self._add(_normalize(df, module))
+
+    def save(self):
+        """Write the Parquet mirror atomically. Returns False if it could not be written."""
+        if not ARROW_AVAILABLE:
+            return False
+        path = self.path
+        try:
+            os.makedirs(LEDGER_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            self.entries.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            print(f"  action ledger: could not store mirror ({e})")
+            return False
+
+    def _add(self, rows):
+        rows = rows[(rows['created_at'] >= self.window_start) & (rows['created_at'] < self.window_end)]
+        if len(rows) == 0:
+            return 0
+        self.entries = pd.concat([self.entries, rows], ignore_index=True)
+        self._reindex()
+        return len(rows)
+
+    def _reindex(self):
+        """Sort entries by SKU and time and rebuild the per-SKU index and flag arrays."""
+        self.entries = self.entries.sort_values(
+            LEDGER_KEY_COLUMNS + ['created_at'], kind='mergesort'
+        ).reset_index(drop=True)
+        e = self.entries
+        self._created = e['created_at'].to_numpy(dtype='datetime64[ns]')
+        self._module = e['module'].to_numpy(dtype=object)
+        self._action = e['price_action'].to_numpy(dtype=object)
+        current, new = e['current_price'].to_numpy(dtype=float), e['new_price'].to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            # Same definitions as the per-module queries this replaces
+            self._is_increase = (
+                e['price_action'].str.contains('increase', case=False, na=False).to_numpy()
+                | (new > current)
+            )
+        self._is_change = (self._action != 'none') & ~np.isnan(new)
+        self._today = self._created >= np.datetime64(self.midnight, 'ns')
+
+        pid, wid = e['product_id'].to_numpy(), e['warehouse_id'].to_numpy()
+        n = len(e)
+        starts = np.flatnonzero(np.r_[True, (pid[1:] != pid[:-1]) | (wid[1:] != wid[:-1])]) if n else np.empty(0, int)
+        ends = np.r_[starts[1:], n].astype(int) if n else np.empty(0, int)
+        self._index = dict(zip(zip(pid[starts].tolist(), wid[starts].tolist()),
+                               zip(starts.tolist(), ends.tolist())))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def newest(self, module=None):
+        """Latest created_at (of ``module``), or None."""
+        created = self._created[self._module_mask(module)]
+        return pd.Timestamp(created.max()) if len(created) else None
+
+    # ------------------------------------------------------------------
+    # Whole-catalogue queries (one row per SKU, ready to merge)
+    # ------------------------------------------------------------------
+    def _module_mask(self, module, rows=slice(None)):
+        modules = self._module[rows]
+        if module is None:
+            return np.ones(len(modules), dtype=bool)
+        return modules == module
+
+    def _since_mask(self, hours, now, rows=slice(None)):
+        cutoff = (now or cairo_now()) - timedelta(hours=hours)
+        if cutoff < self.window_start:
+            raise ValueError(f"{hours}h window starts at {cutoff}, before the ledger window "
+                             f"({self.window_start}); raise LEDGER_LOOKBACK_HOURS")
+        return self._created[rows] >= np.datetime64(cutoff, 'ns')
+
+    def _sku_counts(self, mask, name):
+        keys = self.entries.loc[mask, LEDGER_KEY_COLUMNS]
+        return keys.groupby(LEDGER_KEY_COLUMNS, as_index=False).size().rename(columns={'size': name})
+
+    def frame(self, module=None):
+        """Today's ledger rows (of ``module``) as a DataFrame."""
+        return self.entries[self._module_mask(module) & self._today].reset_index(drop=True)
+
+    def increases_since(self, hours, module=None, now=None, name='increase_count'):
+        """Price increases in the last ``hours`` per SKU."""
+        mask = self._module_mask(module) & self._is_increase & self._since_mask(hours, now)
+        return self._sku_counts(mask, name)
+
+    def changes_since(self, hours, module=None, now=None, name='change_count'):
+        """Price changes (price_action != 'none' with a new_price) in the last ``hours`` per SKU."""
+        mask = self._module_mask(module) & self._is_change & self._since_mask(hours, now)
+        return self._sku_counts(mask, name)
+
+    def step_counts(self, module=None, actions=None, name='step_count'):
+        """Rows today per SKU, optionally limited to ``actions`` (price_action values)."""
+        mask = self._module_mask(module) & self._today
+        if actions is not None:
+            mask &= np.isin(self._action, list(actions))
+        return self._sku_counts(mask, name)
+
+    def last_change(self, module=None, name='last_change_at'):
+        """Time of the latest price change per SKU (within the ledger window)."""
+        mask = self._module_mask(module) & self._is_change
+        rows = self.entries.loc[mask, LEDGER_KEY_COLUMNS + ['created_at']]
+        return rows.groupby(LEDGER_KEY_COLUMNS, as_index=False)['created_at'].max().rename(
+            columns={'created_at': name})
+
+    # ------------------------------------------------------------------
+    # Per-SKU lookups
+    # ------------------------------------------------------------------
+    def _slice(self, product_id, warehouse_id):
+        start, end = self._index.get((int(product_id), int(warehouse_id)), (0, 0))
+        return slice(start, end)
+
+    def sku_entries(self, product_id, warehouse_id):
+        """One SKU's ledger rows, oldest first."""
+        return self.entries.iloc[self._slice(product_id, warehouse_id)]
+
+    def steps_today(self, product_id, warehouse_id, module=None, actions=None):
+        s = self._slice(product_id, warehouse_id)
+        mask = self._module_mask(module, s) & self._today[s]
+        if actions is not None:
+            mask &= np.isin(self._action[s], list(actions))
+        return int(mask.sum())
+
+    def increases_in_last(self, product_id, warehouse_id, hours, module=None, now=None):
+        s = self._slice(product_id, warehouse_id)
+        mask = self._module_mask(module, s) & self._is_increase[s] & self._since_mask(hours, now, s)
+        return int(mask.sum())
+
+    def last_change_time(self, product_id, warehouse_id, module=None):
+        """Latest price change of one SKU (None if it has none in the ledger window)."""
+        s = self._slice(product_id, warehouse_id)
+        created = self._created[s][self._module_mask(module, s) & self._is_change[s]]
+        return pd.Timestamp(created[-1]) if len(created) else None
@@ -1,4 +1,8 @@
+import json
 import logging
+import os
+import threading
+import time
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
@@ -20,251 +24,316 @@ def get_secret(secret_name):
     Raises:
         Exception: If there is an error retrieving the secret from AWS Secrets Manager
     """
-    import boto3
-    import base64
-    region_name = "us-east-1"
-
-    # Create a Secrets Manager client
-    session = boto3.session.Session()
-    client = session.client(service_name="secretsmanager", region_name=region_name)
+    # Shared Secrets Manager client (us-east-1)
+    client = _get_secrets_client()
 
     try:
         get_secret_value_response = client.get_secret_value(SecretId=secret_name)
     except Exception as e:
         raise e
     else:
-        if "SecretString" in get_secret_value_response:
-            return get_secret_value_response["SecretString"]
-        else:
-            return base64.b64decode(get_secret_value_response["SecretBinary"])
+        return _secret_value(get_secret_value_response)
+
+
+# ########## Lazy secret resolution ##########
+# initialize_env() used to make ~25 sequential Secrets Manager calls (every
+# country, Mongo, Odoo, 3CX, ...) and is re-invoked by every helper below.
+# Env vars are now resolved on first read through get_env(): only the secret
+# that backs the requested variable is fetched, and it is cached in-process
+# for SECRET_CACHE_TTL_SECONDS.
+SECRET_CACHE_TTL_SECONDS = 3600
+SECRET_BATCH_SIZE = 20  # BatchGetSecretValue limit per request
+
+INGESTION_KEY_FILE = '/tmp/rsa_key.p8'
+
+_secrets_client = None
+_secret_cache = {}  # secret_name -> (parsed value, fetched_at)
+_secret_lock = threading.Lock()
+_resource_lock = threading.Lock()
+_resources_ready = set()
+
+# env var -> (secret name, field). A plain string is a literal value.
+ENV_SECRETS = {
+    # S3 maintained schema buckets
+    "EGYPT_MAINTAINED_BUCKET": ("prod/s3_buckets_maintained_schemas", "egypt_maintained"),
+    "KENYA_MAINTAINED_BUCKET": ("prod/s3_buckets_maintained_schemas", "kenya_maintained"),
+    "MOROCCO_MAINTAINED_BUCKET": ("prod/s3_buckets_maintained_schemas", "morocco_maintained"),
+    "RWANDA_MAINTAINED_BUCKET": ("prod/s3_buckets_maintained_schemas", "rwanda_maintained"),
+    "TANZANIA_MAINTAINED_BUCKET": ("prod/s3_buckets_maintained_schemas", "tanzania_maintained"),
+
+    # Metabase
+    "EGYPT_METABASE_USERNAME": ("prod/metabase/maxab_config", "metabase_user"),
+    "EGYPT_METABASE_PASSWORD": ("prod/metabase/maxab_config", "metabase_password"),
+    "EGYPT_METABASE_URL": ("prod/metabase/maxab_config", "metabase_egypt_site"),
+    "AFRICA_METABASE_USERNAME": ("prod/metabase/maxab_config", "metabase_user"),
+    "AFRICA_METABASE_PASSWORD": ("prod/metabase/maxab_config", "metabase_password"),
+    "AFRICA_METABASE_URL": ("prod/metabase/maxab_config", "metabase_morocco_site"),
+    "morocco_metabase_user": ("prod/metabase/mohamed_ashraf/user", "username"),
+    "morocco_metabase_password": ("prod/metabase/mohamed_ashraf/user", "password"),
+
+    # Snowflake
+    "SNOWFLAKE_USERNAME": ("Snowflake-sagemaker", "username"),
+    "SNOWFLAKE_PASSWORD": ("Snowflake-sagemaker", "password"),
+    "SNOWFLAKE_ACCOUNT": ("Snowflake-sagemaker", "account"),
+    "SNOWFLAKE_AIRFLOW_WAREHOUSE": ("Snowflake-sagemaker", "airflow_scripts_main_warehouse"),
+    "EGYPT_SNOWFLAKE_DATABASE": ("Snowflake-sagemaker", "database"),
+    "RWANDA_SNOWFLAKE_DATABASE": ("Snowflake-sagemaker", "rwanda_database"),
+    "MOROCCO_SNOWFLAKE_DATABASE": ("Snowflake-sagemaker", "morocco_database"),
+    "TANZANIA_SNOWFLAKE_DATABASE": ("Snowflake-sagemaker", "tanzania_database"),
+    "KENYA_SNOWFLAKE_DATABASE": ("Snowflake-sagemaker", "kenya_database"),
+    "SNOWFLAKE_INGESTION_USERNAME": ("snowflake/users", "AROUSI_USERNAME"),
+    "SNOWFLAKE_INGESTION_PASSWORD": ("snowflake/users", "OMAR_ALAROUSI"),
+    "SNOWFLAKE_DBT_USERNAME": ("prod/dbt/dbt_maxab", "username"),
+    "SNOWFLAKE_DBT_PASSWORD": ("prod/dbt/dbt_maxab", "password"),
+
+    # Snowflake ingestion (key-pair auth)
+    "ingestion_key_bucket": ("prod/snowflake/ingestion", "private_key_bucket"),
+    "ingestion_key_path": ("prod/snowflake/ingestion", "private_key_path"),
+    "ingestion_pass": ("prod/snowflake/ingestion", "encryption_password"),
+    "ingestion_user": ("prod/snowflake/ingestion", "username"),
+    "ingestion_account": ("prod/snowflake/ingestion", "account"),
+    "ingestion_role": ("prod/snowflake/ingestion", "role"),
+    "ingestion_warehouse_default": ("prod/snowflake/ingestion", "warehouse_default"),
+
+    # MaxRoute
+    "MAXROUTE_DWH_READER_HOST": ("prod/rds/maxroute", "host_reader"),
+    "MAXROUTE_DWH_READER_NAME": ("prod/rds/maxroute", "dbname"),
+    "MAXROUTE_DWH_READER_USER_NAME": ("prod/rds/maxroute", "username"),
+    "MAXROUTE_DWH_READER_PASSWORD": ("prod/rds/maxroute", "password"),
+    "MAXROUTE_DWH_WRITER_HOST": ("prod/rds/maxroute", "host_writer"),
+    "MAXROUTE_DWH_WRITER_NAME": ("prod/rds/maxroute", "dbname"),
+    "MAXROUTE_DWH_WRITER_USER_NAME": ("prod/rds/maxroute", "username"),
+    "MAXROUTE_DWH_WRITER_PASSWORD": ("prod/rds/maxroute", "password"),
+
+    # 3CX
+    "THREE_CX_HOST": ("prod/3cx/postgres", "host"),
+    "THREE_CX_HOST_PORT": ("prod/3cx/postgres", "host_port"),
+    "THREE_CX_USERNAME": ("prod/3cx/postgres", "username"),
+    "THREE_CX_PASSWORD": ("prod/3cx/postgres", "password"),
+    "THREE_CX_DB_NAME": ("prod/3cx/postgres", "dbname"),
+    "THREE_CX_REMOTE_PORT": ("prod/3cx/postgres", "remote_port"),
+    "THREE_CX_LOCAL_PORT": ("prod/3cx/postgres", "local_port"),
+
+    # Mongo
+    "MONGO_CONNECTION": ("prod/db/mongodb/sagemaker", "mongodb_connection"),
+
+    # Odoo Shamselkheir portal
+    "SHAMSELKHEIR_ODOO_URL": ("prod/odoo/shamselkheir", "url"),
+    "SHAMSELKHEIR_ODOO_DB": ("prod/odoo/shamselkheir", "db"),
+    "SHAMSELKHEIR_ODOO_USERNAME": ("prod/odoo/shamselkheir", "username"),
+    "SHAMSELKHEIR_ODOO_PASSWORD": ("prod/odoo/shamselkheir", "password"),
+
+    # MaxSupport
+    "MAXSUPPORT_HOST": ("prod/db/maxsupport/writer", "host"),
+    "MAXSUPPORT_NAME": ("prod/db/maxsupport/writer", "dbname"),
+    "MAXSUPPORT_USERNAME": ("prod/db/maxsupport/writer", "username"),
+    "MAXSUPPORT_PASSWORD": ("prod/db/maxsupport/writer", "password"),
+
+    # Fintech e-money
+    "FINTECH_EMONEY_EMAIL": ("prod/fintechServiceEmail/credentials", "email_name"),
+    "FINTECH_EMONEY_PASSWORD": ("prod/fintechServiceEmail/credentials", "email_password"),
+
+    # Slack
+    "SLACK_TOKEN": ("prod/slack/reports", "token"),
+}
+
+# Countries DWH credentials (Morocco shares the Egypt DWH host, different database)
+_DWH_SECRETS = {
+    "EGYPT": ("prod/db/datawarehouse/metabase", "prod/db/datawarehouse/sagemaker"),
+    "MOROCCO": ("prod/db/datawarehouse/metabase", "prod/db/datawarehouse/sagemaker"),
+    "ZAMBIA": ("prod/db/zambia/reader", "prod/db/zambia/sagemaker"),
+    "KENYA": ("prod/db/kenya/reader", "prod/db/kenya/sagemaker"),
+    "RWANDA": ("prod/db/rwanda/reader", "prod/db/rwanda/sagemaker"),
+    "TANZANIA": ("prod/db/tanzania/reader", "prod/db/tanzania/sagemaker"),
+}
+for _country, (_reader, _writer) in _DWH_SECRETS.items():
+    for _action, _secret in (("READER", _reader), ("WRITER", _writer)):
+        ENV_SECRETS[f"{_country}_DWH_{_action}_HOST"] = (_secret, "host")
+        ENV_SECRETS[f"{_country}_DWH_{_action}_NAME"] = 'morocco' if _country == "MOROCCO" else (_secret, "dbname")
+        ENV_SECRETS[f"{_country}_DWH_{_action}_USER_NAME"] = (_secret, "username")
+        ENV_SECRETS[f"{_country}_DWH_{_action}_PASSWORD"] = (_secret, "password")
+
+
+def _get_secrets_client():
+    """Shared Secrets Manager client (session creation is not free)."""
+    global _secrets_client
+    with _secret_lock:
+        if _secrets_client is None:
+            import boto3
+            _secrets_client = boto3.session.Session().client(service_name="secretsmanager", region_name="us-east-1")
+    return _secrets_client
+
+
+def _secret_value(item):
+    """SecretString as-is, SecretBinary base64-decoded (GetSecretValue and BatchGetSecretValue items)."""
+    import base64
+
+    if "SecretString" in item:
+        return item["SecretString"]
+    return base64.b64decode(item["SecretBinary"])
+
+
+def _parse_secret(value):
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return value
 
 
-def initialize_env():
+def prefetch_secrets(secret_names, ttl=SECRET_CACHE_TTL_SECONDS):
     """
-    Initialize environment variables by loading secrets from AWS Secrets Manager.
-    
-    This function retrieves various database credentials, API keys, and configuration
-    settings from AWS Secrets Manager and sets them as environment variables.
-    It handles credentials for multiple countries (Egypt, Morocco, Zambia, Kenya, Rwanda, Tanzania),
-    Snowflake connections, Metabase access, MongoDB, Odoo, 3CX, MaxSupport, and various
-    cloud services including BigQuery, Google Sheets, and Slack.
-    
-    The function sets environment variables for:
-    - Database connections (DWH reader/writer for each country)
-    - Snowflake credentials and databases
-    - Metabase access credentials
-    - S3 bucket configurations
-    - Various service account credentials
-    - API tokens and keys
-    
-    Note: This function must be called before using any database or service connections.
+    Warm the secret cache for several secrets at once.
+
+    Uses BatchGetSecretValue (up to SECRET_BATCH_SIZE secrets per request) and
+    falls back to one GetSecretValue per secret when the batch API is not
+    available (older boto3) or not permitted.
+
+    Args:
+        secret_names (iterable): Secret names/identifiers to load
+        ttl (int): Seconds a cached secret stays valid
     """
-    import json
+    now = time.time()
+    with _secret_lock:
+        missing = sorted({name for name in secret_names
+                          if name not in _secret_cache or now - _secret_cache[name][1] >= ttl})
+    if not missing:
+        return
+
+    fetched = {}
+    client = _get_secrets_client()
+    try:
+        for start in range(0, len(missing), SECRET_BATCH_SIZE):
+            batch = missing[start:start + SECRET_BATCH_SIZE]
+            response = client.batch_get_secret_value(SecretIdList=batch)
+            for item in response.get("SecretValues", []):
+                # Results carry ARN and Name; cache under the id the caller asked for
+                # (name, full ARN, or partial ARN without the random suffix)
+                arn = item.get("ARN", "")
+                requested = [sid for sid in batch
+                             if sid in (arn, item.get("Name")) or (sid.startswith("arn:") and arn.startswith(sid + "-"))]
+                for secret_id in requested or [item["Name"]]:
+                    fetched[secret_id] = _secret_value(item)
+            for error in response.get("Errors", []):
+                logger.warning(f"Batch secret fetch failed for {error.get('SecretId')}: {error.get('Message')}")
+    except Exception as e:
+        logger.warning(f"BatchGetSecretValue unavailable, fetching secrets one by one: {e}")
+
+    for name in missing:
+        if name not in fetched:
+            fetched[name] = get_secret(name)
+
+    with _secret_lock:
+        for name, value in fetched.items():
+            _secret_cache[name] = (_parse_secret(value), time.time())
+
+
+def get_cached_secret(secret_name, ttl=SECRET_CACHE_TTL_SECONDS):
+    """
+    Return a secret from the in-process cache, fetching it on miss or expiry.
+
+    JSON secrets are returned parsed (dict); other secrets as stored.
+    """
+    with _secret_lock:
+        entry = _secret_cache.get(secret_name)
+    if entry is None or time.time() - entry[1] >= ttl:
+        value = _parse_secret(get_secret(secret_name))
+        with _secret_lock:
+            _secret_cache[secret_name] = (value, time.time())
+        return value
+    return entry[0]
+
+
+def clear_secret_cache():
+    """Drop cached secrets so the next read goes back to Secrets Manager."""
+    with _secret_lock:
+        _secret_cache.clear()
+    with _resource_lock:
+        _resources_ready.clear()
+
+
+def get_env(name):
+    """
+    Read an environment variable, resolving it from Secrets Manager on first use.
+
+    Variables listed in ENV_SECRETS are fetched lazily (only their backing
+    secret), cached with a TTL and exported to os.environ so subprocesses and
+    legacy readers see them. Anything else is read from os.environ as-is.
+
+    Raises:
+        KeyError: If the variable is neither set nor known to ENV_SECRETS
+    """
+    if name == "GOOGLE_APPLICATION_CREDENTIALS_SHEETS":
+        return _ensure_sheets_key_file()
+
+    spec = ENV_SECRETS.get(name)
+    if spec is None:
+        return os.environ[name]
+    if isinstance(spec, str):
+        value = spec
+    else:
+        secret_name, field = spec
+        value = get_cached_secret(secret_name)[field]
+    os.environ[name] = value
+    return value
+
+
+def _ensure_ingestion_key_file():
+    """Download the Snowflake ingestion private key once per process."""
+    with _resource_lock:
+        if "ingestion_key" not in _resources_ready:
+            import boto3
+            boto3.client('s3').download_file(
+                get_env("ingestion_key_bucket"), get_env("ingestion_key_path"), INGESTION_KEY_FILE
+            )
+            _resources_ready.add("ingestion_key")
+    return INGESTION_KEY_FILE
+
+
+def _ensure_sheets_key_file():
+    """Write the Google Sheets service account key once per process."""
     from pathlib import Path
-    import os
-    import boto3
-
-    # Loads the secrets from Secrets Manager
-    dwh_reader_secret = json.loads(get_secret("prod/db/datawarehouse/metabase"))
-    dwh_writer_secret = json.loads(get_secret("prod/db/datawarehouse/sagemaker"))
-    snowflake_secret = json.loads(get_secret("Snowflake-sagemaker"))
-    snowflake_users_secret = json.loads(get_secret("snowflake/users"))
-    maxroute_dwh_secret= json.loads(get_secret("prod/rds/maxroute"))
-    morocco_metabase_access= json.loads(get_secret("prod/metabase/mohamed_ashraf/user"))
-    zamabia_dwh_writer_secret=json.loads(get_secret("prod/db/zambia/sagemaker"))
-    zamabia_dwh_reader_secret=json.loads(get_secret("prod/db/zambia/reader"))
-    kenya_dwh_writer_secret=json.loads(get_secret("prod/db/kenya/sagemaker"))
-    kenya_dwh_reader_secret=json.loads(get_secret("prod/db/kenya/reader"))
-    rwanda_dwh_writer_secret=json.loads(get_secret("prod/db/rwanda/sagemaker"))
-    rwanda_dwh_reader_secret=json.loads(get_secret("prod/db/rwanda/reader"))
-    tanzania_dwh_writer_secret=json.loads(get_secret("prod/db/tanzania/sagemaker"))
-    tanzania_dwh_reader_secret=json.loads(get_secret("prod/db/tanzania/reader"))
-    snowflake_secret = json.loads(get_secret("Snowflake-sagemaker"))
-    mongo_creds = json.loads(get_secret("prod/db/mongodb/sagemaker"))
-    maintained_schemas_buckets = json.loads(get_secret("prod/s3_buckets_maintained_schemas"))
-    shamselkheir_odoo_secret = json.loads(get_secret("prod/odoo/shamselkheir"))
-    three_cx_egypt_secret = json.loads(get_secret('prod/3cx/postgres'))
-    snowflake_dbt_maxab = json.loads(get_secret("prod/dbt/dbt_maxab"))
-    maxsupport_secret = json.loads(get_secret("prod/db/maxsupport/writer"))
-    fintech_service_account = json.loads(get_secret("prod/fintechServiceEmail/credentials"))
-
-    # RETRIEVING MAINTAINED SCHEMAS S3 BUCKETS NAMES
-    os.environ["EGYPT_MAINTAINED_BUCKET"] = maintained_schemas_buckets["egypt_maintained"]
-    os.environ["KENYA_MAINTAINED_BUCKET"] = maintained_schemas_buckets["kenya_maintained"]
-    os.environ["MOROCCO_MAINTAINED_BUCKET"] = maintained_schemas_buckets["morocco_maintained"]
-    os.environ["RWANDA_MAINTAINED_BUCKET"] = maintained_schemas_buckets["rwanda_maintained"]
-    os.environ["TANZANIA_MAINTAINED_BUCKET"] = maintained_schemas_buckets["tanzania_maintained"]
-    
-    # RETRIEVING METABASE SECRET
-    metabase_secret = json.loads(get_secret("prod/metabase/maxab_config"))
-    os.environ["EGYPT_METABASE_USERNAME"] = metabase_secret["metabase_user"]
-    os.environ["EGYPT_METABASE_PASSWORD"] = metabase_secret["metabase_password"]
-    os.environ["EGYPT_METABASE_URL"] = metabase_secret["metabase_egypt_site"]
-    
-    os.environ["AFRICA_METABASE_USERNAME"] = metabase_secret["metabase_user"]
-    os.environ["AFRICA_METABASE_PASSWORD"] = metabase_secret["metabase_password"]
-    os.environ["AFRICA_METABASE_URL"] = metabase_secret["metabase_morocco_site"]
-
-    # ########## countries DWH credentials ##########
-    #Egypt
-    os.environ["EGYPT_DWH_READER_HOST"] = dwh_reader_secret["host"]
-    os.environ["EGYPT_DWH_READER_NAME"] = dwh_reader_secret["dbname"]
-    os.environ["EGYPT_DWH_READER_USER_NAME"] = dwh_reader_secret["username"]
-    os.environ["EGYPT_DWH_READER_PASSWORD"] = dwh_reader_secret["password"]
-    
-    os.environ["EGYPT_DWH_WRITER_HOST"] = dwh_writer_secret["host"]
-    os.environ["EGYPT_DWH_WRITER_NAME"] = dwh_writer_secret["dbname"]
-    os.environ["EGYPT_DWH_WRITER_USER_NAME"] = dwh_writer_secret["username"]
-    os.environ["EGYPT_DWH_WRITER_PASSWORD"] = dwh_writer_secret["password"]
-    
-    #Morocco
-    os.environ["MOROCCO_DWH_READER_HOST"] = dwh_reader_secret["host"]
-    os.environ["MOROCCO_DWH_READER_NAME"] = 'morocco'
-    os.environ["MOROCCO_DWH_READER_USER_NAME"] = dwh_reader_secret["username"]
-    os.environ["MOROCCO_DWH_READER_PASSWORD"] = dwh_reader_secret["password"]
-    
-    os.environ["MOROCCO_DWH_WRITER_HOST"] = dwh_writer_secret["host"]
-    os.environ["MOROCCO_DWH_WRITER_NAME"] = 'morocco'
-    os.environ["MOROCCO_DWH_WRITER_USER_NAME"] = dwh_writer_secret["username"]
-    os.environ["MOROCCO_DWH_WRITER_PASSWORD"] = dwh_writer_secret["password"]
-    
-    #Zambia
-    os.environ["ZAMBIA_DWH_READER_HOST"] = zamabia_dwh_reader_secret["host"]
-    os.environ["ZAMBIA_DWH_READER_NAME"] = zamabia_dwh_reader_secret["dbname"]
-    os.environ["ZAMBIA_DWH_READER_USER_NAME"] = zamabia_dwh_reader_secret["username"]
-    os.environ["ZAMBIA_DWH_READER_PASSWORD"] = zamabia_dwh_reader_secret["password"]
-    
-    os.environ["ZAMBIA_DWH_WRITER_HOST"] = zamabia_dwh_writer_secret["host"]
-    os.environ["ZAMBIA_DWH_WRITER_NAME"] = zamabia_dwh_writer_secret["dbname"]
-    os.environ["ZAMBIA_DWH_WRITER_USER_NAME"] = zamabia_dwh_writer_secret["username"]
-    os.environ["ZAMBIA_DWH_WRITER_PASSWORD"] = zamabia_dwh_writer_secret["password"]
-    
-    #Kenya
-    os.environ["KENYA_DWH_READER_HOST"] = kenya_dwh_reader_secret["host"]
-    os.environ["KENYA_DWH_READER_NAME"] = kenya_dwh_reader_secret["dbname"]
-    os.environ["KENYA_DWH_READER_USER_NAME"] = kenya_dwh_reader_secret["username"]
-    os.environ["KENYA_DWH_READER_PASSWORD"] = kenya_dwh_reader_secret["password"]
-    
-    os.environ["KENYA_DWH_WRITER_HOST"] = kenya_dwh_writer_secret["host"]
-    os.environ["KENYA_DWH_WRITER_NAME"] = kenya_dwh_writer_secret["dbname"]
-    os.environ["KENYA_DWH_WRITER_USER_NAME"] = kenya_dwh_writer_secret["username"]
-    os.environ["KENYA_DWH_WRITER_PASSWORD"] = kenya_dwh_writer_secret["password"]
-
-    #Rwanda
-    os.environ["RWANDA_DWH_READER_HOST"] = rwanda_dwh_reader_secret["host"]
-    os.environ["RWANDA_DWH_READER_NAME"] = rwanda_dwh_reader_secret["dbname"]
-    os.environ["RWANDA_DWH_READER_USER_NAME"] = rwanda_dwh_reader_secret["username"]
-    os.environ["RWANDA_DWH_READER_PASSWORD"] = rwanda_dwh_reader_secret["password"]
-    
-    os.environ["RWANDA_DWH_WRITER_HOST"] = rwanda_dwh_writer_secret["host"]
-    os.environ["RWANDA_DWH_WRITER_NAME"] = rwanda_dwh_writer_secret["dbname"]
-    os.environ["RWANDA_DWH_WRITER_USER_NAME"] = rwanda_dwh_writer_secret["username"]
-    os.environ["RWANDA_DWH_WRITER_PASSWORD"] = rwanda_dwh_writer_secret["password"] 
-
-    #Tanzania
-    os.environ["TANZANIA_DWH_READER_HOST"] = tanzania_dwh_reader_secret["host"]
-    os.environ["TANZANIA_DWH_READER_NAME"] = tanzania_dwh_reader_secret["dbname"]
-    os.environ["TANZANIA_DWH_READER_USER_NAME"] = tanzania_dwh_reader_secret["username"]
-    os.environ["TANZANIA_DWH_READER_PASSWORD"] = tanzania_dwh_reader_secret["password"]
-    
-    os.environ["TANZANIA_DWH_WRITER_HOST"] = tanzania_dwh_writer_secret["host"]
-    os.environ["TANZANIA_DWH_WRITER_NAME"] = tanzania_dwh_writer_secret["dbname"]
-    os.environ["TANZANIA_DWH_WRITER_USER_NAME"] = tanzania_dwh_writer_secret["username"]
-    os.environ["TANZANIA_DWH_WRITER_PASSWORD"] = tanzania_dwh_writer_secret["password"] 
-
-    # ########## countries SNOWFLAKE credentials ##########
-    os.environ["SNOWFLAKE_USERNAME"] = snowflake_secret["username"]
-    os.environ["SNOWFLAKE_PASSWORD"] = snowflake_secret["password"]
-    os.environ["SNOWFLAKE_ACCOUNT"] = snowflake_secret["account"]
-    os.environ["SNOWFLAKE_AIRFLOW_WAREHOUSE"] = snowflake_secret["airflow_scripts_main_warehouse"]
-    os.environ["EGYPT_SNOWFLAKE_DATABASE"] = snowflake_secret["database"]
-    os.environ["RWANDA_SNOWFLAKE_DATABASE"] = snowflake_secret["rwanda_database"]
-    os.environ["MOROCCO_SNOWFLAKE_DATABASE"] = snowflake_secret["morocco_database"]
-    os.environ["TANZANIA_SNOWFLAKE_DATABASE"] = snowflake_secret["tanzania_database"]
-    os.environ["KENYA_SNOWFLAKE_DATABASE"] = snowflake_secret["kenya_database"]
-    os.environ["SNOWFLAKE_INGESTION_USERNAME"] = snowflake_users_secret['AROUSI_USERNAME']
-    os.environ["SNOWFLAKE_INGESTION_PASSWORD"] = snowflake_users_secret["OMAR_ALAROUSI"]
-    
-    # ########## DBT SNOWFLAKE credentials ##########
-    os.environ["SNOWFLAKE_DBT_USERNAME"] = snowflake_dbt_maxab["username"]
-    os.environ["SNOWFLAKE_DBT_PASSWORD"] = snowflake_dbt_maxab["password"]
-
-    ########### MAXROUTE credentials ##########
-    os.environ["MAXROUTE_DWH_READER_HOST"] = maxroute_dwh_secret["host_reader"]
-    os.environ["MAXROUTE_DWH_READER_NAME"] = maxroute_dwh_secret["dbname"]
-    os.environ["MAXROUTE_DWH_READER_USER_NAME"] = maxroute_dwh_secret["username"]
-    os.environ["MAXROUTE_DWH_READER_PASSWORD"] = maxroute_dwh_secret["password"]
-    os.environ["MAXROUTE_DWH_WRITER_HOST"] = maxroute_dwh_secret["host_writer"]
-    os.environ["MAXROUTE_DWH_WRITER_NAME"] = maxroute_dwh_secret["dbname"]
-    os.environ["MAXROUTE_DWH_WRITER_USER_NAME"] = maxroute_dwh_secret["username"]
-    os.environ["MAXROUTE_DWH_WRITER_PASSWORD"] = maxroute_dwh_secret["password"]
-    
-    os.environ["morocco_metabase_user"] = morocco_metabase_access["username"]
-    os.environ["morocco_metabase_password"] = morocco_metabase_access["password"]
-        
-    # ########## THREE_CX credentials ##########
-    os.environ['THREE_CX_HOST'] = three_cx_egypt_secret['host']
-    os.environ['THREE_CX_HOST_PORT'] = three_cx_egypt_secret['host_port']
-    os.environ['THREE_CX_USERNAME'] = three_cx_egypt_secret['username']
-    os.environ['THREE_CX_PASSWORD'] = three_cx_egypt_secret['password']
-    os.environ['THREE_CX_DB_NAME'] = three_cx_egypt_secret['dbname']
-    os.environ['THREE_CX_REMOTE_PORT'] = three_cx_egypt_secret['remote_port']
-    os.environ['THREE_CX_LOCAL_PORT'] = three_cx_egypt_secret['local_port']
-    
-    ########### Mongo credentials ##########
-    os.environ["MONGO_CONNECTION"] = mongo_creds["mongodb_connection"]
-
-    ########### ODOO SHAMSELKHEIR Portal credentials ##########
-    os.environ["SHAMSELKHEIR_ODOO_URL"] = shamselkheir_odoo_secret["url"]
-    os.environ["SHAMSELKHEIR_ODOO_DB"] = shamselkheir_odoo_secret["db"]
-    os.environ["SHAMSELKHEIR_ODOO_USERNAME"] = shamselkheir_odoo_secret["username"]
-    os.environ["SHAMSELKHEIR_ODOO_PASSWORD"] = shamselkheir_odoo_secret["password"]
-    
-    ########### MAXSUPPORT credentials ##########
-    os.environ["MAXSUPPORT_HOST"] = maxsupport_secret["host"]
-    os.environ["MAXSUPPORT_NAME"] = maxsupport_secret["dbname"]
-    os.environ["MAXSUPPORT_USERNAME"] = maxsupport_secret["username"]
-    os.environ["MAXSUPPORT_PASSWORD"] = maxsupport_secret["password"]
-    
-    ########### SNOWFLAKE INGESTION credentials ##########
-    snowflake_ingestion_secrets = json.loads(get_secret("prod/snowflake/ingestion"))
-
-    os.environ["ingestion_key_bucket"] = snowflake_ingestion_secrets["private_key_bucket"]
-    os.environ["ingestion_key_path"] = snowflake_ingestion_secrets["private_key_path"]
-    os.environ["ingestion_pass"] = snowflake_ingestion_secrets["encryption_password"]
-    os.environ["ingestion_user"] = snowflake_ingestion_secrets["username"]
-    os.environ["ingestion_account"] = snowflake_ingestion_secrets["account"]
-    os.environ["ingestion_role"] = snowflake_ingestion_secrets["role"]
-    os.environ["ingestion_warehouse_default"] = snowflake_ingestion_secrets["warehouse_default"]
-    ########### FINTECH_EMONEY credentials ##########
-    os.environ["FINTECH_EMONEY_EMAIL"] = fintech_service_account["email_name"]
-    os.environ["FINTECH_EMONEY_PASSWORD"] = fintech_service_account["email_password"]
-
-    s3 = boto3.client('s3')
-
-    bucket_name = os.environ["ingestion_key_bucket"]
-    key_name = os.environ["ingestion_key_path"]
-    s3.download_file(bucket_name, key_name, '/tmp/rsa_key.p8')
-    
-    # ########## BigQuery credentials ##########
-    # json_path = str(Path.home())+"/service_account_key.json"
-    # print(json_path)
-    # bigquery_key = get_secret("prod/bigquery/sagemaker")
-    # f = open(json_path, "w")
-    # f.write(bigquery_key)
-    # f.close()
-
-    # ########## GOOGLE SHEETS credentials ##########
-    json_path_sheets = str(Path.home())+"/service_account_key_sheets.json"
-    sheets_key = get_secret("prod/maxab-sheets")
-    f = open(json_path_sheets, "w")
-    f.write(sheets_key)
-    f.close()
+
+    json_path_sheets = str(Path.home()) + "/service_account_key_sheets.json"
+    with _resource_lock:
+        if "sheets_key" not in _resources_ready:
+            sheets_key = get_secret("prod/maxab-sheets")
+            with open(json_path_sheets, "w") as f:
+                f.write(sheets_key if isinstance(sheets_key, str) else sheets_key.decode("utf-8"))
+            _resources_ready.add("sheets_key")
     os.environ["GOOGLE_APPLICATION_CREDENTIALS_SHEETS"] = json_path_sheets
+    return json_path_sheets
+
+
+def initialize_env(names=None, eager=False):
+    """
+    Prepare credentials for database and service connections.
+
+    Secrets are resolved lazily by get_env() (see ENV_SECRETS), so by default
+    this call does no network I/O and is cheap to repeat inside every helper.
+    Code that reads os.environ directly (instead of get_env) can request the
+    variables it needs up front.
+
+    Args:
+        names (list, optional): Env var names to resolve and export now. Their
+                                secrets are fetched in one batch.
+        eager (bool): Resolve every known variable plus the ingestion key and
+                      Google Sheets key files (the previous behaviour).
+
+    Note: Helpers in this module call get_env() and do not need this.
+    """
+    if eager:
+        names = list(ENV_SECRETS)
+    if not names:
+        return
+
+    prefetch_secrets({ENV_SECRETS[n][0] for n in names
+                      if n in ENV_SECRETS and not isinstance(ENV_SECRETS[n], str)})
+    for name in names:
+        get_env(name)
 
-    # ########## SLACK credentials ##########
-    slack_secret = json.loads(get_secret("prod/slack/reports"))
-    os.environ["SLACK_TOKEN"] = slack_secret["token"]
+    if eager:
+        _ensure_ingestion_key_file()
+        _ensure_sheets_key_file()
 
 
 def google_sheets(workbook, sheet, action,cols=[], df=None):
@@ -297,7 +366,6 @@ def google_sheets(workbook, sheet, action,cols=[], df=None):
     from oauth2client.service_account import ServiceAccountCredentials
     import gspread
     from gspread_dataframe import get_as_dataframe, set_with_dataframe
-    import os
     import pandas as pd
 
     initialize_env()
@@ -309,7 +377,7 @@ def google_sheets(workbook, sheet, action,cols=[], df=None):
         'https://www.googleapis.com/auth/drive'
     ]
     
-    creds = ServiceAccountCredentials.from_json_keyfile_name(os.environ["GOOGLE_APPLICATION_CREDENTIALS_SHEETS"] , scope)
+    creds = ServiceAccountCredentials.from_json_keyfile_name(get_env("GOOGLE_APPLICATION_CREDENTIALS_SHEETS"), scope)
     client = gspread.authorize(creds)
     wks = client.open(workbook).worksheet(sheet)
     
@@ -364,11 +432,10 @@ def send_text_slack(channel, text):
     """
     import slack
     from slack_sdk import WebClient # slack client to send files
-    import os
 
     initialize_env()
 
-    client = WebClient(token=os.environ["SLACK_TOKEN"])
+    client = WebClient(token=get_env("SLACK_TOKEN"))
     try:
         client.chat_postMessage(
         channel=channel,
@@ -420,7 +487,7 @@ def send_file_slack(file_or_df, initial_comment, channel, filename=None):
         slack_filename = filename or file_or_df
     
     try:
-        slack_client = WebClient(os.environ["SLACK_TOKEN"])
+        slack_client = WebClient(get_env("SLACK_TOKEN"))
         with open(upload_path, 'rb') as file:
             slack_client.files_upload_v2(
                 title=initial_comment,
@@ -505,7 +572,6 @@ def dwh_query(country, query, action, columns=[], conn=None):
     """
     import psycopg2
     import pandas as pd
-    import os
 
     initialize_env()
     
@@ -525,10 +591,10 @@ def dwh_query(country, query, action, columns=[], conn=None):
             password = conn['password']
         
         else:
-            host = os.environ[f'{country.upper()}_DWH_{credentials_action}_HOST']
-            database = os.environ[f'{country.upper()}_DWH_{credentials_action}_NAME']
-            user = os.environ[f'{country.upper()}_DWH_{credentials_action}_USER_NAME']
-            password = os.environ[f'{country.upper()}_DWH_{credentials_action}_PASSWORD']
+            host = get_env(f'{country.upper()}_DWH_{credentials_action}_HOST')
+            database = get_env(f'{country.upper()}_DWH_{credentials_action}_NAME')
+            user = get_env(f'{country.upper()}_DWH_{credentials_action}_USER_NAME')
+            password = get_env(f'{country.upper()}_DWH_{credentials_action}_PASSWORD')
 
         # Establish database connection
         with psycopg2.connect(host=host, database=database, user=user, password=password) as conn:
@@ -587,7 +653,6 @@ def upload_dataframe_to_pg(df, country, if_exists, schema_name, table_name, db_c
     """
     from sqlalchemy import create_engine
     import pandas as pd
-    import os
     
     initialize_env()
     if db_conn:
@@ -596,17 +661,17 @@ def upload_dataframe_to_pg(df, country, if_exists, schema_name, table_name, db_c
         user = db_conn['user']
         password = db_conn['password']
     else:
-        host = os.environ[f'{country.upper()}_DWH_WRITER_HOST']
-        database = os.environ[f'{country.upper()}_DWH_WRITER_NAME']
-        user = os.environ[f'{country.upper()}_DWH_WRITER_USER_NAME']
-        password = os.environ[f'{country.upper()}_DWH_WRITER_PASSWORD']
+        host = get_env(f'{country.upper()}_DWH_WRITER_HOST')
+        database = get_env(f'{country.upper()}_DWH_WRITER_NAME')
+        user = get_env(f'{country.upper()}_DWH_WRITER_USER_NAME')
+        password = get_env(f'{country.upper()}_DWH_WRITER_PASSWORD')
 
     engine = create_engine(f'postgresql+psycopg2://{user}:{password}@{host}/{database}')
         
     df.to_sql(table_name.lower(), schema=schema_name.lower(), con=engine, if_exists=if_exists.lower(), index=False)
 
 
-def snowflake_query(country, query, warehouse=None, columns=[], conn=None):
+def snowflake_query(country, query, warehouse=None, columns=[], conn=None, pooled=True, dtypes=None, arrow=True):
     """
     Execute SQL queries against Snowflake data warehouse.
     
@@ -626,6 +691,13 @@ def snowflake_query(country, query, warehouse=None, columns=[], conn=None):
                                                                  uses this connection instead
                                                                  of creating a new one.
                                                                  Defaults to None.
+        pooled (bool, optional): When no ``conn`` is given, borrow the connection from
+                                 the process-wide pool in ``db.snowflake_pool`` instead
+                                 of opening and closing a new one. Defaults to True.
+        dtypes (dict, optional): {column: dtype} casts applied to the result. Defaults to None.
+        arrow (bool, optional): Fetch via Arrow (``fetch_pandas_all``) so Snowflake
+                                NUMBER/DATE types are kept instead of going through
+                                ``np.array(results)`` (object dtype). Defaults to True.
     
     Returns:
         pandas.DataFrame: Query results as a DataFrame with lowercase column names
@@ -636,55 +708,56 @@ def snowflake_query(country, query, warehouse=None, columns=[], conn=None):
     Note: 
         - This function automatically calls initialize_env() to set up credentials.
         - Uses private key authentication with RSA key stored in /tmp/rsa_key.p8.
+        - Pooled connections stay open after the call; see db.get_pool_stats().
         - Column names in the returned DataFrame are converted to lowercase.
         - Returns empty DataFrame with proper column structure if no results.
     """
     import snowflake.connector
-    import os
-    import pandas as pd
-    import numpy as np
 
     initialize_env()
     
-    if conn:
-        con = conn
+    if warehouse:
+        warehouse_name = get_env(f"{warehouse}")
     else:
+        warehouse_name = get_env("SNOWFLAKE_AIRFLOW_WAREHOUSE")
+
+    if not conn:
         config = {
-            'user': os.environ["ingestion_user"],
-            'account': os.environ["ingestion_account"],
-            'private_key_file': '/tmp/rsa_key.p8',
-            'private_key_file_pwd': os.environ["ingestion_pass"].encode('utf-8'),
-            'database': os.environ[f"{country.upper()}_SNOWFLAKE_DATABASE"],
-            'role': os.environ["ingestion_role"],
+            'user': get_env("ingestion_user"),
+            'account': get_env("ingestion_account"),
+            'private_key_file': _ensure_ingestion_key_file(),
+            'private_key_file_pwd': get_env("ingestion_pass").encode('utf-8'),
+            'database': get_env(f"{country.upper()}_SNOWFLAKE_DATABASE"),
+            'role': get_env("ingestion_role"),
             'schema': 'PUBLIC'
         }
-        
+
+    if not conn and pooled:
+        from db import snowflake_pool
+
+        with snowflake_pool.connection(config, warehouse_name) as con:
+            cur = con.cursor()
+            try:
+                cur.execute(query)
+                return _snowflake_cursor_to_df(cur, columns, dtypes, arrow)
+            except Exception as e:
+                logger.error(f"An error occurred: {e}", exc_info=True)
+                raise
+            finally:
+                cur.close()
+
+    if conn:
+        con = conn
+    else:
         con = snowflake.connector.connect(**config)
 
     try:
         cur = con.cursor()
-        if warehouse:
-            cur.execute(f'USE WAREHOUSE {os.environ[f"{warehouse}"]}')
-        else:
-            cur.execute(f'USE WAREHOUSE {os.environ["SNOWFLAKE_AIRFLOW_WAREHOUSE"]}')
+        cur.execute(f'USE WAREHOUSE {warehouse_name}')
         
         cur.execute(query)
         
-        column_names = [col[0] for col in cur.description]
-        
-        results = cur.fetchall()
-        
-        if not results:
-            out = pd.DataFrame(columns=[name.lower() for name in column_names])
-        else:
-            if len(columns) == 0:
-                out = pd.DataFrame(np.array(results), columns=column_names)
-                out.columns = out.columns.str.lower()
-            else:
-                out = pd.DataFrame(np.array(results), columns=columns)
-                out.columns = out.columns.str.lower()
-        
-        return out
+        return _snowflake_cursor_to_df(cur, columns, dtypes, arrow)
     except Exception as e:
         logger.error(f"An error occurred: {e}", exc_info=True)
         raise
@@ -693,6 +766,37 @@ def snowflake_query(country, query, warehouse=None, columns=[], conn=None):
         con.close()
 
 
+def _snowflake_cursor_to_df(cur, columns=[], dtypes=None, arrow=True):
+    """Build the snowflake_query() result DataFrame from an executed cursor."""
+    import pandas as pd
+    import numpy as np
+
+    if arrow:
+        from db import fetch_dataframe
+
+        return fetch_dataframe(cur, columns=[c.lower() for c in columns] or None,
+                               dtypes=dtypes, coerce_numeric=False)
+
+    column_names = [col[0] for col in cur.description]
+    
+    results = cur.fetchall()
+    
+    if not results:
+        out = pd.DataFrame(columns=[name.lower() for name in column_names])
+    else:
+        if len(columns) == 0:
+            out = pd.DataFrame(np.array(results), columns=column_names)
+            out.columns = out.columns.str.lower()
+        else:
+            out = pd.DataFrame(np.array(results), columns=columns)
+            out.columns = out.columns.str.lower()
+
+    if dtypes:
+        out = out.astype({col: dtype for col, dtype in dtypes.items() if col in out.columns})
+    
+    return out
+
+
 def upload_dataframe_to_snowflake(country, df, schema_name, table_name, method, auto_create_table=True, conn=None):
     """
     Upload a pandas DataFrame to a Snowflake table.
@@ -732,7 +836,6 @@ def upload_dataframe_to_snowflake(country, df, schema_name, table_name, method,
     """
     import snowflake.connector
     from snowflake.connector.pandas_tools import write_pandas
-    import os
 
     initialize_env()
     
@@ -744,13 +847,13 @@ def upload_dataframe_to_snowflake(country, df, schema_name, table_name, method,
         conn = conn
     else:
         conn = snowflake.connector.connect(
-            user=os.environ["ingestion_user"],
-            account=os.environ["ingestion_account"],
-            private_key_file='/tmp/rsa_key.p8',
-            private_key_file_pwd=os.environ["ingestion_pass"].encode('utf-8'),
-            database=os.environ[f"{country.upper()}_SNOWFLAKE_DATABASE"],
-            role=os.environ["ingestion_role"],
-            warehouse=os.environ["SNOWFLAKE_AIRFLOW_WAREHOUSE"]
+            user=get_env("ingestion_user"),
+            account=get_env("ingestion_account"),
+            private_key_file=_ensure_ingestion_key_file(),
+            private_key_file_pwd=get_env("ingestion_pass").encode('utf-8'),
+            database=get_env(f"{country.upper()}_SNOWFLAKE_DATABASE"),
+            role=get_env("ingestion_role"),
+            warehouse=get_env("SNOWFLAKE_AIRFLOW_WAREHOUSE")
         )
     
     success = 'Failed'
@@ -843,7 +946,6 @@ def ret_metabase(country, question, use_query=False, filters={}, warehouse=None)
     import requests
     import pandas as pd
     import json
-    import os
 
     initialize_env()
     
@@ -851,12 +953,12 @@ def ret_metabase(country, question, use_query=False, filters={}, warehouse=None)
     
     if country.lower() == 'egypt':
         base_url = 'https://bi.maxab.info/api'
-        username = str(os.environ["EGYPT_METABASE_USERNAME"])
-        password = str(os.environ["EGYPT_METABASE_PASSWORD"])
+        username = str(get_env("EGYPT_METABASE_USERNAME"))
+        password = str(get_env("EGYPT_METABASE_PASSWORD"))
     else:
         base_url = 'https://bi.maxabma.com/api'
-        username = str(os.environ["AFRICA_METABASE_USERNAME"])
-        password = str(os.environ["AFRICA_METABASE_PASSWORD"])
+        username = str(get_env("AFRICA_METABASE_USERNAME"))
+        password = str(get_env("AFRICA_METABASE_PASSWORD"))
 
     base_headers = {'Content-Type': 'application/json'}
 
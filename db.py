@@ -4,20 +4,236 @@ Shared database connection utilities for the MaxAB pricing system.
 Provides a single query_snowflake() implementation to replace the 12
 duplicate definitions scattered across notebooks.
 
+Connections are kept in a process-wide pool (``snowflake_pool``) keyed by
+login parameters + warehouse, so back-to-back queries in one notebook run
+reuse the same Snowflake session instead of paying the login handshake and
+``USE WAREHOUSE`` on every call.
+
+Large parameter sets (SKU lists, packing units) are passed as session
+TEMPORARY tables (``snowflake_session`` / ``query_with_temp_tables``)
+instead of being inlined into ``VALUES`` lists, so query text stays fixed.
+
 Usage in notebooks:
     import sys, os
     sys.path.insert(0, os.path.abspath('..'))  # if running from modules/
     from db import query_snowflake
 """
 
+import atexit
+import hashlib
+import json
 import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
 import pandas as pd
+import pytz
 import snowflake.connector
 
+try:
+    import pyarrow  # noqa: F401  (needed by cursor.fetch_pandas_all)
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
 SNOWFLAKE_WAREHOUSE = "COMPUTE_WH"
 
+# Pool tuning
+POOL_MAX_IDLE_PER_KEY = 6          # idle connections kept per (login, warehouse)
+POOL_IDLE_TIMEOUT_SECONDS = 900    # close connections idle longer than this
+POOL_HEALTH_CHECK_SECONDS = 120    # ping connections idle longer than this before reuse
+
+# Disk cache for slow-changing reference queries (see cached_query)
+QUERY_CACHE_DIR = os.environ.get(
+    "PRICING_QUERY_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pricing_query_cache")
+)
+CACHE_TIMEZONE = pytz.timezone("Africa/Cairo")
+
+# fetch_many() concurrency (kept <= POOL_MAX_IDLE_PER_KEY so every worker connection is reused)
+FETCH_MANY_MAX_WORKERS = 6
+
+
+class SnowflakeConnectionPool:
+    """
+    Thread-safe pool of open Snowflake connections.
+
+    Connections are grouped by a key built from the connect() kwargs and the
+    warehouse, so a pooled connection is only handed out to callers asking
+    for the same login, database and warehouse. ``USE WAREHOUSE`` runs once,
+    when the connection is opened.
+
+    Idle connections are closed after ``idle_timeout`` seconds. A connection
+    that has been idle longer than ``health_check_after`` seconds is pinged
+    with ``SELECT 1`` before reuse and replaced if the ping fails.
+    """
+
+    def __init__(self, max_idle_per_key=POOL_MAX_IDLE_PER_KEY,
+                 idle_timeout=POOL_IDLE_TIMEOUT_SECONDS,
+                 health_check_after=POOL_HEALTH_CHECK_SECONDS):
+        self.max_idle_per_key = max_idle_per_key
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self._lock = threading.Lock()
+        self._idle = {}  # key -> list of (connection, last_used_ts)
+        self._stats = {
+            'fresh_logins': 0,
+            'reused': 0,
+            'health_check_failures': 0,
+            'evicted_idle': 0,
+            'discarded_on_error': 0,
+        }
+
+    @staticmethod
+    def _make_key(connect_kwargs: dict, warehouse: str | None) -> tuple:
+        return (tuple(sorted(connect_kwargs.items())), warehouse)
+
+    def _evict_expired(self, now: float):
+        """Close idle connections past idle_timeout. Caller holds the lock."""
+        expired = []
+        for key, entries in self._idle.items():
+            keep = []
+            for con, last_used in entries:
+                if now - last_used > self.idle_timeout:
+                    expired.append(con)
+                else:
+                    keep.append((con, last_used))
+            self._idle[key] = keep
+        self._stats['evicted_idle'] += len(expired)
+        return expired
+
+    @staticmethod
+    def _close_quietly(con):
+        try:
+            con.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, con) -> bool:
+        if con.is_closed():
+            return False
+        try:
+            cur = con.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _open(self, connect_kwargs: dict, warehouse: str | None):
+        con = snowflake.connector.connect(**connect_kwargs)
+        if warehouse:
+            cur = con.cursor()
+            try:
+                cur.execute(f"USE WAREHOUSE {warehouse}")
+            finally:
+                cur.close()
+        with self._lock:
+            self._stats['fresh_logins'] += 1
+        return con
+
+    def acquire(self, connect_kwargs: dict, warehouse: str | None = None):
+        """Return an open connection for (connect_kwargs, warehouse)."""
+        key = self._make_key(connect_kwargs, warehouse)
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                expired = self._evict_expired(now)
+                entries = self._idle.get(key, [])
+                candidate = entries.pop() if entries else None
+            for con in expired:
+                self._close_quietly(con)
+            if candidate is None:
+                return self._open(connect_kwargs, warehouse)
+
+            con, last_used = candidate
+            if now - last_used > self.health_check_after and not self._is_healthy(con):
+                with self._lock:
+                    self._stats['health_check_failures'] += 1
+                self._close_quietly(con)
+                continue
+            if con.is_closed():
+                continue
+            with self._lock:
+                self._stats['reused'] += 1
+            return con
+
+    def release(self, connect_kwargs: dict, warehouse: str | None, con, broken: bool = False):
+        """Return a connection to the pool (or close it if broken / pool is full)."""
+        key = self._make_key(connect_kwargs, warehouse)
+        if broken or con.is_closed():
+            with self._lock:
+                self._stats['discarded_on_error'] += 1
+            self._close_quietly(con)
+            return
+        with self._lock:
+            entries = self._idle.setdefault(key, [])
+            if len(entries) < self.max_idle_per_key:
+                entries.append((con, time.monotonic()))
+                return
+        self._close_quietly(con)
+
+    @contextmanager
+    def connection(self, connect_kwargs: dict, warehouse: str | None = None):
+        """Context manager: borrow a pooled connection and give it back on exit."""
+        con = self.acquire(connect_kwargs, warehouse)
+        broken = False
+        try:
+            yield con
+        except snowflake.connector.errors.ProgrammingError:
+            # SQL errors leave the session usable
+            raise
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(connect_kwargs, warehouse, con, broken=broken)
+
+    def stats(self) -> dict:
+        """Counters for connection reuse vs fresh logins, plus current idle size."""
+        with self._lock:
+            out = dict(self._stats)
+            out['idle_connections'] = sum(len(v) for v in self._idle.values())
+        total = out['fresh_logins'] + out['reused']
+        out['reuse_ratio'] = round(out['reused'] / total, 3) if total else 0.0
+        return out
+
+    def close_all(self):
+        """Close every idle connection (registered with atexit)."""
+        with self._lock:
+            entries = [con for v in self._idle.values() for con, _ in v]
+            self._idle = {}
+        for con in entries:
+            self._close_quietly(con)
+
+
+snowflake_pool = SnowflakeConnectionPool()
+atexit.register(snowflake_pool.close_all)
+
+
+def get_pool_stats() -> dict:
+    """Return connection-pool counters (fresh_logins, reused, reuse_ratio, ...)."""
+    return snowflake_pool.stats()
+
+
+def _default_connect_kwargs() -> dict:
+    return {
+        'user': os.environ["SNOWFLAKE_USERNAME"],
+        'account': os.environ["SNOWFLAKE_ACCOUNT"],
+        'password': os.environ["SNOWFLAKE_PASSWORD"],
+        'database': os.environ["SNOWFLAKE_DATABASE"],
+    }
 
-def query_snowflake(query: str, columns: list | None = None) -> pd.DataFrame:
+
+def query_snowflake(query: str, columns: list | None = None, pooled: bool = True,
+                    dtypes: dict | None = None, arrow: bool = True) -> pd.DataFrame:
     """
     Execute a SQL query against Snowflake and return results as a DataFrame.
 
@@ -26,32 +242,402 @@ def query_snowflake(query: str, columns: list | None = None) -> pd.DataFrame:
 
     If ``columns`` is provided, use it as DataFrame column names; otherwise use
     Snowflake cursor descriptions (lowercased).
+
+    Results are fetched as Arrow batches (``fetch_pandas_all``), so NUMBER,
+    FLOAT, DATE and TIMESTAMP columns arrive already typed. Integer columns
+    are widened to int64 and object / string columns still go through
+    ``pd.to_numeric`` (see fetch_dataframe), so the dtypes match the fetchall
+    path. ``dtypes`` ({column: dtype}) is applied afterwards for explicit
+    casts, e.g. ``{'product_id': 'int64'}``. Pass ``arrow=False`` for the
+    legacy fetchall path.
+
+    By default the connection is borrowed from ``snowflake_pool``; pass
+    ``pooled=False`` to open (and close) a dedicated connection.
     """
-    con = snowflake.connector.connect(
-        user=os.environ["SNOWFLAKE_USERNAME"],
-        account=os.environ["SNOWFLAKE_ACCOUNT"],
-        password=os.environ["SNOWFLAKE_PASSWORD"],
-        database=os.environ["SNOWFLAKE_DATABASE"],
-    )
+    connect_kwargs = _default_connect_kwargs()
+    if pooled:
+        with snowflake_pool.connection(connect_kwargs, SNOWFLAKE_WAREHOUSE) as con:
+            return _run_query(con, query, columns, dtypes, arrow)
+
+    con = snowflake.connector.connect(**connect_kwargs)
     try:
         cur = con.cursor()
         cur.execute(f"USE WAREHOUSE {SNOWFLAKE_WAREHOUSE}")
+        cur.close()
+        return _run_query(con, query, columns, dtypes, arrow)
+    finally:
+        con.close()
+
+
+def _run_query(con, query: str, columns: list | None, dtypes: dict | None,
+               arrow: bool) -> pd.DataFrame:
+    cur = con.cursor()
+    try:
         cur.execute(query)
+        return fetch_dataframe(cur, columns=columns, dtypes=dtypes, arrow=arrow)
+    finally:
+        cur.close()
+
+
+def _coerce_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """pd.to_numeric on every object / string column, leaving it as is if that fails."""
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+    return df
+
+
+def _widen_integer_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """int8/int16/int32 (and unsigned) columns -> int64, as the fetchall path returned them."""
+    narrow = {col: 'int64' for col, dtype in df.dtypes.items()
+              if dtype.name in ('int8', 'int16', 'int32', 'uint8', 'uint16', 'uint32')}
+    return df.astype(narrow) if narrow else df
+
+
+def fetch_dataframe(cur, columns: list | None = None, dtypes: dict | None = None,
+                    arrow: bool = True, coerce_numeric: bool = True) -> pd.DataFrame:
+    """
+    Build a DataFrame from an executed Snowflake cursor.
+
+    Uses the Arrow result format when available (typed columns, no Python
+    tuples). Falls back to ``fetchall`` for result sets Arrow cannot serve
+    (SHOW / DESCRIBE commands, or pyarrow not installed).
+
+    On both paths the result keeps the types the fetchall path produced:
+    Arrow sizes NUMBER(p,0) columns to the data (int8/int16/int32), so they
+    are widened to int64, and with ``coerce_numeric`` (default) object /
+    string columns go through ``pd.to_numeric`` so VARCHAR-encoded numbers
+    arrive as numbers.
+
+    Column names are lowercased unless ``columns`` overrides them.
+    ``dtypes`` casts the listed columns (missing ones are ignored).
+    """
+    df = None
+    if arrow and ARROW_AVAILABLE:
+        try:
+            df = cur.fetch_pandas_all()
+        except snowflake.connector.errors.NotSupportedError:
+            df = None
+
+    if df is not None:
+        if len(df.columns) == 0 and cur.description:
+            # Empty results can come back without a schema
+            df = pd.DataFrame(columns=[desc[0] for desc in cur.description])
+        if columns is not None:
+            df.columns = columns
+        else:
+            df.columns = [str(c).lower() for c in df.columns]
+        df = _widen_integer_columns(df)
+    else:
         data = cur.fetchall()
         if columns is not None:
             df = pd.DataFrame(data, columns=columns)
         else:
             col_names = [desc[0].lower() for desc in cur.description]
             df = pd.DataFrame(data, columns=col_names)
-        for col in df.columns:
-            if df[col].dtype == object:
+    if coerce_numeric:
+        df = _coerce_numeric_columns(df)
+
+    if dtypes:
+        df = df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+    return df
+
+
+# Wall time (seconds) per query name from the most recent fetch_many() call
+LAST_FETCH_TIMINGS: dict = {}
+
+
+def fetch_many(queries: dict, max_workers: int = FETCH_MANY_MAX_WORKERS) -> dict:
+    """
+    Run independent queries concurrently and return ``{name: DataFrame}``.
+
+    Each value in ``queries`` is either a SQL string (executed with
+    query_snowflake on a pooled connection) or a zero-argument callable that
+    returns a DataFrame, e.g. a queries_module getter such as
+    ``get_current_stocks``.
+
+    Queries run on a bounded thread pool, so the total wall time is roughly
+    that of the slowest query. Per-query wall time is stored in
+    ``LAST_FETCH_TIMINGS`` (plus ``'_total'``). If any query fails, the
+    remaining ones still finish and the first error is re-raised.
+    """
+    def _run(name, q):
+        start = time.perf_counter()
+        try:
+            return q() if callable(q) else query_snowflake(q)
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    timings = {}
+    results = {}
+    errors = []
+    start = time.perf_counter()
+    workers = max(1, min(max_workers, len(queries)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch_many') as executor:
+        futures = {executor.submit(_run, name, q): name for name, q in queries.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors.append((name, e))
+    timings['_total'] = time.perf_counter() - start
+
+    LAST_FETCH_TIMINGS.clear()
+    LAST_FETCH_TIMINGS.update(timings)
+
+    per_query = ', '.join(
+        f"{name}={secs:.1f}s"
+        for name, secs in sorted(timings.items(), key=lambda kv: -kv[1]) if name != '_total'
+    )
+    print(f"fetch_many: {len(queries)} queries in {timings['_total']:.1f}s ({per_query})")
+
+    if errors:
+        name, e = errors[0]
+        raise RuntimeError(f"fetch_many: query '{name}' failed: {e}") from e
+    return {name: results[name] for name in queries}
+
+
+# =============================================================================
+# SESSION-SCOPED PARAMETER TABLES
+# =============================================================================
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# pandas dtype.kind -> Snowflake column type (anything else is VARCHAR)
+_SNOWFLAKE_COLUMN_TYPES = {
+    'b': 'BOOLEAN',
+    'i': 'NUMBER(38,0)',
+    'u': 'NUMBER(38,0)',
+    'f': 'FLOAT',
+    'M': 'TIMESTAMP_NTZ',
+}
+
+
+class SnowflakeSession:
+    """
+    One pooled connection held for a block of related queries.
+
+    Snowflake TEMPORARY tables live as long as the session that created them,
+    so a parameter set (SKU pairs, packing units, ...) is bulk-loaded once
+    with load_temp_table() and joined by name from every query run through
+    query(). The SQL text no longer embeds the values, so it stays the same
+    however many rows are passed instead of growing a VALUES list per call.
+    """
+
+    def __init__(self, con):
+        self.con = con
+        self.temp_tables = []
+
+    def load_temp_table(self, name: str, df: pd.DataFrame) -> str:
+        """
+        (Re)create TEMPORARY table ``name`` with df's columns and rows.
+
+        Column types follow the pandas dtypes (ints -> NUMBER, floats ->
+        FLOAT, bools -> BOOLEAN, datetimes -> TIMESTAMP_NTZ, else VARCHAR).
+        Rows go in with ``write_pandas`` (one staged Parquet COPY) when
+        pyarrow is available, else with a bound executemany INSERT.
+        """
+        bad = [n for n in [name, *map(str, df.columns)] if not _IDENTIFIER_RE.match(n)]
+        if bad:
+            raise ValueError(f"load_temp_table: not a plain identifier: {bad}")
+        columns = ', '.join(
+            f"{col} {_SNOWFLAKE_COLUMN_TYPES.get(df[col].dtype.kind, 'VARCHAR')}" for col in df.columns
+        )
+        cur = self.con.cursor()
+        try:
+            cur.execute(f"CREATE OR REPLACE TEMPORARY TABLE {name} ({columns})")
+            if name not in self.temp_tables:
+                self.temp_tables.append(name)
+            if len(df) == 0:
+                return name
+            if ARROW_AVAILABLE:
+                from snowflake.connector.pandas_tools import write_pandas
+                write_pandas(self.con, df.reset_index(drop=True), name.upper(), quote_identifiers=False)
+            else:
+                placeholders = ', '.join(['%s'] * len(df.columns))
+                rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+                cur.executemany(f"INSERT INTO {name} VALUES ({placeholders})", list(rows))
+        finally:
+            cur.close()
+        return name
+
+    def query(self, query: str, columns: list | None = None, dtypes: dict | None = None,
+              arrow: bool = True) -> pd.DataFrame:
+        """query_snowflake() on this session's connection (sees its temp tables)."""
+        return _run_query(self.con, query, columns, dtypes, arrow)
+
+    def drop_temp_tables(self):
+        """Drop every temp table this session loaded (the connection goes back to the pool)."""
+        cur = self.con.cursor()
+        try:
+            for name in self.temp_tables:
                 try:
-                    df[col] = pd.to_numeric(df[col])
-                except (ValueError, TypeError):
+                    cur.execute(f"DROP TABLE IF EXISTS {name}")
+                except Exception:
                     pass
-        return df
-    finally:
-        con.close()
+        finally:
+            cur.close()
+        self.temp_tables = []
+
+
+@contextmanager
+def snowflake_session(temp_tables: dict | None = None):
+    """
+    Borrow one pooled connection for several queries.
+
+    ``temp_tables`` ({name: DataFrame}) are loaded as session TEMPORARY
+    tables before the block runs and dropped when it exits, e.g.::
+
+        with snowflake_session({'tmp_selected_skus': df_skus}) as session:
+            df_a = session.query(QUERY_A)   # both join tmp_selected_skus
+            df_b = session.query(QUERY_B)
+    """
+    connect_kwargs = _default_connect_kwargs()
+    with snowflake_pool.connection(connect_kwargs, SNOWFLAKE_WAREHOUSE) as con:
+        session = SnowflakeSession(con)
+        try:
+            for name, df in (temp_tables or {}).items():
+                session.load_temp_table(name, df)
+            yield session
+        finally:
+            if not con.is_closed():
+                session.drop_temp_tables()
+
+
+def query_with_temp_tables(query: str, temp_tables: dict, columns: list | None = None,
+                           dtypes: dict | None = None) -> pd.DataFrame:
+    """query_snowflake() for one query that joins parameter tables ({name: DataFrame})."""
+    with snowflake_session(temp_tables) as session:
+        return session.query(query, columns=columns, dtypes=dtypes)
+
+
+# =============================================================================
+# QUERY RESULT CACHE (Parquet on local disk)
+# =============================================================================
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0, 'write_errors': 0}
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return re.sub(r"\s+", " ", query).strip().rstrip(";").strip()
+
+
+def until_next_cairo_hour(hour: int = 8):
+    """TTL policy: valid until the next ``hour``:00 Cairo time (e.g. the 08:00 refresh)."""
+    def _expiry(fetched_at: datetime) -> datetime:
+        local = fetched_at.astimezone(CACHE_TIMEZONE)
+        boundary = CACHE_TIMEZONE.localize(
+            datetime(local.year, local.month, local.day, hour)
+        )
+        if boundary <= local:
+            boundary = CACHE_TIMEZONE.localize(
+                datetime(local.year, local.month, local.day, hour) + timedelta(days=1)
+            )
+        return boundary
+    return _expiry
+
+
+def _cache_paths(key: str) -> tuple:
+    return (os.path.join(QUERY_CACHE_DIR, f"{key}.parquet"),
+            os.path.join(QUERY_CACHE_DIR, f"{key}.json"))
+
+
+def _cache_key(query: str, columns: list | None) -> str:
+    raw = json.dumps([os.environ.get("SNOWFLAKE_DATABASE", ""), normalize_sql(query), columns])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _bump(stat: str):
+    with _cache_lock:
+        _cache_stats[stat] += 1
+
+
+def cached_query(query: str, ttl=None, columns: list | None = None,
+                 dtypes: dict | None = None) -> pd.DataFrame:
+    """
+    query_snowflake() with a disk-backed result cache.
+
+    Results are stored as Parquet under ``QUERY_CACHE_DIR``, keyed by the
+    normalized SQL text (+ database and ``columns``), so every notebook run on
+    the same machine shares them. ``ttl`` is a ``timedelta``, a number of
+    seconds, or a callable ``fetched_at -> expires_at`` such as
+    ``until_next_cairo_hour(8)`` (the default).
+
+    Use only for reference data that changes at most daily; intraday inputs
+    (stocks, UTH, last-hour performance) should call query_snowflake directly.
+    """
+    if ttl is None:
+        ttl = until_next_cairo_hour(8)
+
+    key = _cache_key(query, columns)
+    data_path, meta_path = _cache_paths(key)
+    now = datetime.now(CACHE_TIMEZONE)
+
+    if ARROW_AVAILABLE and os.path.exists(meta_path) and os.path.exists(data_path):
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if now < datetime.fromisoformat(meta['expires_at']):
+                df = pd.read_parquet(data_path)
+                _bump('hits')
+                if dtypes:
+                    df = df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+                return df
+            _bump('expired')
+        except (OSError, ValueError, KeyError):
+            pass
+
+    _bump('misses')
+    df = query_snowflake(query, columns=columns, dtypes=dtypes)
+
+    if ARROW_AVAILABLE:
+        if callable(ttl):
+            expires_at = ttl(now)
+        elif isinstance(ttl, timedelta):
+            expires_at = now + ttl
+        else:
+            expires_at = now + timedelta(seconds=ttl)
+        try:
+            os.makedirs(QUERY_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, data_path)
+            with open(meta_path, "w") as f:
+                json.dump({'query': normalize_sql(query), 'fetched_at': now.isoformat(),
+                           'expires_at': expires_at.isoformat(), 'rows': len(df)}, f)
+            _bump('writes')
+        except Exception as e:
+            # Mixed-type object columns can fail Parquet conversion - serve uncached
+            _bump('write_errors')
+            print(f"  query cache: could not store result ({e})")
+    return df
+
+
+def invalidate_query_cache(query: str | None = None, columns: list | None = None) -> int:
+    """Drop one cached query (or the whole cache when ``query`` is None). Returns files removed."""
+    if not os.path.isdir(QUERY_CACHE_DIR):
+        return 0
+    if query is not None:
+        targets = [p for p in _cache_paths(_cache_key(query, columns)) if os.path.exists(p)]
+    else:
+        targets = [os.path.join(QUERY_CACHE_DIR, name) for name in os.listdir(QUERY_CACHE_DIR)
+                   if name.endswith((".parquet", ".json"))]
+    for path in targets:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return len(targets)
+
+
+def get_query_cache_stats() -> dict:
+    """Return cache counters (hits, misses, expired, writes, write_errors)."""
+    with _cache_lock:
+        return dict(_cache_stats)
 
 
 def get_snowflake_timezone() -> str:
@@ -0,0 +1,165 @@
+"""
+Grouped quantiles in one sort-based pass.
+
+Percentile aggregations in the modules were written as
+``groupby(...).agg(perc_15=('x', lambda v: np.percentile(v, 15)), ...)`` (one
+Python call per group per quantile) or ``groupby(...).apply(weighted_median)``.
+Here the values are sorted once by (group, value); every group is a
+contiguous segment of the sorted array, so any number of quantiles for all
+groups is a handful of array lookups.
+
+Two definitions are supported:
+- unweighted: ``np.percentile`` 'linear' (= Snowflake PERCENTILE_CONT), exact
+  to the last bit
+- weighted: the first value whose cumulative weight reaches ``q / 100 * total``,
+  i.e. ``weighted_median`` in market_data_module for q = 50 (weights are
+  assumed non-negative; tied values keep their row order)
+
+NaN values are skipped: a group's quantiles are those of its non-NaN values,
+and only a group with no valid value gets NaN. This differs from the
+``np.percentile`` lambdas it replaces, which return NaN for the whole group as
+soon as one value is NaN (pandas' own ``quantile`` skips NaN the same way as
+here). Callers that relied on NaN poisoning must drop such groups themselves.
+
+Usage in notebooks:
+    import sys, os
+    sys.path.insert(0, os.path.abspath('..'))  # if running from modules/
+    from grouped_quantiles import grouped_quantiles
+
+    percs = grouped_quantiles(df, ['brand', 'cat', 'region'], 'margin',
+                              {'perc_25': 25, 'perc_50': 50, 'perc_75': 75})
+    medians = grouped_quantiles(df, ['group_id', 'cohort_id'], price_cols,
+                                {'{col}': 50}, weights='cntrb')
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def sort_segments(group_codes, values, n_groups):
+    """
+    Sort values by (group, value). Returns (order, offsets): group g owns
+    ``order[offsets[g]:offsets[g + 1]]``. Rows with a negative code or a NaN
+    value are left out.
+    """
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    keep = np.flatnonzero((group_codes >= 0) & ~np.isnan(values))
+    order = keep[np.lexsort((values[keep], group_codes[keep]))]
+    offsets = np.zeros(n_groups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(group_codes[keep], minlength=n_groups), out=offsets[1:])
+    return order, offsets
+
+
+def segment_percentiles(sorted_values, offsets, q):
+    """
+    np.percentile(segment, q) with linear interpolation for every segment of
+    an ascending-sorted array (q in 0-100, scalar or one per segment); NaN
+    for empty segments.
+    """
+    n_groups = len(offsets) - 1
+    q = np.broadcast_to(np.asarray(q, dtype=float), (n_groups,))
+    lengths = np.diff(offsets)
+    out = np.full(n_groups, np.nan)
+    has = lengths > 0
+    if not has.any():
+        return out
+    n = lengths[has]
+    start = offsets[:-1][has]
+    virtual = (n - 1) * (q[has] / 100)
+    lo = np.floor(virtual).astype(np.int64)
+    hi = np.minimum(lo + 1, n - 1)
+    gamma = virtual - lo
+    a, b = sorted_values[start + lo], sorted_values[start + hi]
+    diff = b - a
+    # Same lerp as numpy's 'linear' method
+    out[has] = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+    return out
+
+
+def segment_cumsums(sorted_values, offsets):
+    """np.cumsum within each segment (sequential adds, restarting at 0)."""
+    lengths = np.diff(offsets)
+    seg = np.repeat(np.arange(len(lengths)), lengths)
+    return pd.Series(sorted_values).groupby(seg).cumsum().to_numpy(dtype=float)
+
+
+def segment_sums(sorted_values, offsets, cumsums=None):
+    """
+    np.sum() of each segment, bit-identical: numpy adds fewer than 8 values
+    left to right (= the last running sum) and switches to pairwise
+    summation from 8 on, so only those segments call np.sum directly.
+    """
+    lengths = np.diff(offsets)
+    cumsums = segment_cumsums(sorted_values, offsets) if cumsums is None else cumsums
+    out = np.zeros(len(lengths))
+    has = lengths > 0
+    out[has] = cumsums[offsets[1:][has] - 1]
+    for g in np.flatnonzero(lengths >= 8):
+        out[g] = np.sum(sorted_values[offsets[g]:offsets[g + 1]])
+    return out
+
+
+def segment_weighted_quantiles(sorted_values, sorted_weights, offsets, q):
+    """
+    Weighted quantile per segment: the first value whose running weight is
+    >= ``q / 100 * segment total`` (np.searchsorted on the cumulative
+    weights, as weighted_median does for q = 50). NaN for empty segments.
+    """
+    n_groups = len(offsets) - 1
+    q = np.broadcast_to(np.asarray(q, dtype=float), (n_groups,))
+    lengths = np.diff(offsets)
+    out = np.full(n_groups, np.nan)
+    has = lengths > 0
+    if not has.any():
+        return out
+    cumsums = segment_cumsums(sorted_weights, offsets)
+    target = segment_sums(sorted_weights, offsets, cumsums) * (q / 100)
+    seg = np.repeat(np.arange(n_groups), lengths)
+    # First position per segment with cumsum >= target (last one if none)
+    idx = np.arange(len(sorted_values))
+    candidate = np.where(cumsums >= target[seg], idx, offsets[1:][seg] - 1)
+    first = np.minimum.reduceat(candidate, offsets[:-1][has])
+    out[has] = sorted_values[first]
+    return out
+
+
+def grouped_quantiles(df, by, columns, quantiles, weights=None, dropna=True):
+    """
+    Quantiles of ``columns`` per ``by`` group, one sort per column.
+
+    quantiles: {output_name: q (0-100)}; with several columns the names may
+      contain ``{col}`` (e.g. ``{'{col}_p50': 50}``).
+    weights: optional weight column -> weighted quantiles (rows with a NaN
+      value or weight are skipped per column, like weighted_median).
+
+    Returns one row per group (groupby(by, sort=True) order, keys as
+    columns); groups without valid values get NaN.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    grouped = df.groupby(by, sort=True, dropna=dropna)
+    codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    out = grouped.size().index.to_frame(index=False)
+    n_groups = len(out)
+    w_all = None if weights is None else pd.to_numeric(df[weights], errors='coerce').to_numpy(dtype=float)
+
+    for col in columns:
+        values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+        if w_all is not None:
+            values = np.where(np.isnan(w_all), np.nan, values)
+        order, offsets = sort_segments(codes, values, n_groups)
+        sorted_values = values[order]
+        for name, q in quantiles.items():
+            label = name.format(col=col) if '{col}' in name else name
+            if w_all is None:
+                out[label] = segment_percentiles(sorted_values, offsets, q)
+            else:
+                out[label] = segment_weighted_quantiles(sorted_values, w_all[order], offsets, q)
+    return out
+
+
+def grouped_counts(df, by, column, dropna=True):
+    """Non-null count of ``column`` per group, aligned with grouped_quantiles()."""
+    by = [by] if isinstance(by, str) else list(by)
+    return df.groupby(by, sort=True, dropna=dropna)[column].count().to_numpy()
@@ -0,0 +1,299 @@
+"""
+Shared MaxAB API client utilities for the pricing handlers.
+
+Every handler used to copy get_access_token()/_get_api_token() and request a
+fresh SSO token before each post_prices / post_cart_rules / QD call, so a
+multi-cohort, multi-chunk push made dozens of token round trips. This module
+keeps one cached token per (SSO url, client, user), refreshed once under a
+lock shortly before ``expires_in``, and one persistent ``requests.Session``
+(keep-alive, pooled connections) shared by all handlers in the process.
+
+Cohort uploads go through send_with_retry() (shared requests-per-second
+budget, backoff on 429/5xx) and run_per_cohort() (independent cohorts in
+parallel, chunks of one cohort still in order). Asynchronous endpoints
+(e.g. bulk-upload sheet validation) are polled with poll_with_backoff().
+
+Usage in notebooks:
+    import sys, os
+    sys.path.insert(0, os.path.abspath('..'))  # if running from modules/
+    from maxab_api import get_api_token, get_api_session
+
+    token = get_api_token(API_USERNAME, API_PASSWORD, API_SECRET)
+    response = get_api_session().post(url, headers={'Authorization': f'bearer {token}'}, ...)
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SSO_TOKEN_URL = 'https://sso.maxab.info/auth/realms/maxab/protocol/openid-connect/token'
+API_CLIENT_ID = 'main-system-externals'
+
+TOKEN_REFRESH_MARGIN_SECONDS = 60   # refresh this long before expires_in
+TOKEN_DEFAULT_TTL_SECONDS = 300     # used when the SSO response has no expires_in
+TOKEN_REQUEST_TIMEOUT_SECONDS = 30
+
+SESSION_POOL_MAXSIZE = 16           # keep-alive connections per host
+
+# Upload scheduler (cohort sheets for prices / cart rules)
+UPLOAD_MAX_WORKERS = 4              # cohorts uploaded concurrently
+UPLOAD_REQUESTS_PER_SECOND = 2.0    # shared request budget across all workers
+UPLOAD_MAX_RETRIES = 4
+UPLOAD_BACKOFF_SECONDS = 2.0        # first retry wait, doubled per attempt
+UPLOAD_BACKOFF_MAX_SECONDS = 30.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Non-idempotent requests (idempotent=False) only retry when the request
+# was certainly not processed: rate-limited, or no connection was made
+NON_IDEMPOTENT_RETRY_STATUS_CODES = {429}
+
+# Polling of asynchronous endpoints (poll_with_backoff)
+POLL_INITIAL_WAIT_SECONDS = 1.0     # first wait, doubled per pending response
+POLL_MAX_WAIT_SECONDS = 15.0
+POLL_TIMEOUT_SECONDS = 120.0
+
+
+class TokenManager:
+    """
+    Thread-safe cache for one OAuth2 password-grant access token.
+
+    The token is reused until ``refresh_margin`` seconds before it expires.
+    Concurrent callers that find it expired wait on the lock and get the
+    token fetched by the first one, so the SSO endpoint sees one refresh.
+    """
+
+    def __init__(self, username, password, client_secret, client_id=API_CLIENT_ID,
+                 url=SSO_TOKEN_URL, refresh_margin=TOKEN_REFRESH_MARGIN_SECONDS):
+        self.username = username
+        self.password = password
+        self.client_secret = client_secret
+        self.client_id = client_id
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self.refreshes = 0
+
+    def _fetch(self):
+        response = get_api_session().post(
+            self.url,
+            data={
+                "grant_type": "password",
+                "username": self.username,
+                "password": self.password
+            },
+            auth=(self.client_id, self.client_secret),
+            timeout=TOKEN_REQUEST_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+        payload = response.json()
+        expires_in = float(payload.get("expires_in") or TOKEN_DEFAULT_TTL_SECONDS)
+        return payload["access_token"], time.time() + expires_in
+
+    def get_token(self, force_refresh=False):
+        """Return a valid access token, refreshing it if it is about to expire."""
+        with self._lock:
+            if force_refresh or self._token is None or time.time() >= self._expires_at - self.refresh_margin:
+                self._token, self._expires_at = self._fetch()
+                self.refreshes += 1
+            return self._token
+
+    def invalidate(self):
+        """Forget the cached token (e.g. after a 401) so the next call refreshes."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_token_manager(username, password, client_secret, client_id=API_CLIENT_ID, url=SSO_TOKEN_URL):
+    """Return the process-wide TokenManager for these credentials."""
+    key = (url, client_id, username)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None or manager.password != password or manager.client_secret != client_secret:
+            manager = TokenManager(username, password, client_secret, client_id=client_id, url=url)
+            _managers[key] = manager
+        return manager
+
+
+def get_api_token(username, password, client_secret, client_id=API_CLIENT_ID, url=SSO_TOKEN_URL):
+    """Cached access token for the MaxAB API (see TokenManager)."""
+    return get_token_manager(username, password, client_secret, client_id, url).get_token()
+
+
+def invalidate_api_tokens():
+    """Drop every cached token."""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.invalidate()
+
+
+def get_api_session():
+    """Persistent requests.Session shared by all handlers (HTTP keep-alive)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=SESSION_POOL_MAXSIZE, pool_maxsize=SESSION_POOL_MAXSIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def get_token_stats():
+    """Token refresh counts per (url, client_id, username), for run summaries."""
+    with _managers_lock:
+        return {key: manager.refreshes for key, manager in _managers.items()}
+
+
+class RateLimiter:
+    """
+    Thread-safe requests-per-second budget shared by concurrent uploaders.
+
+    Calls to acquire() are spaced at least ``1 / rate`` seconds apart across
+    all threads; a rate of 0 or None disables limiting.
+    """
+
+    def __init__(self, rate=UPLOAD_REQUESTS_PER_SECOND):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+upload_rate_limiter = RateLimiter(UPLOAD_REQUESTS_PER_SECOND)
+
+
+def set_upload_rate(requests_per_second):
+    """Change the shared upload budget (requests per second, 0 = unlimited)."""
+    upload_rate_limiter.rate = requests_per_second
+
+
+def _retry_wait(response, attempt, backoff):
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), UPLOAD_BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+    return min(backoff * (2 ** attempt), UPLOAD_BACKOFF_MAX_SECONDS) + random.uniform(0, 0.5)
+
+
+def send_with_retry(send, limiter=None, max_retries=UPLOAD_MAX_RETRIES, backoff=UPLOAD_BACKOFF_SECONDS,
+                    idempotent=True):
+    """
+    Call ``send()`` (a zero-arg function returning a requests.Response) under
+    the shared rate limit, retrying on 429/5xx and connection errors.
+
+    With ``idempotent=False`` (e.g. a POST that starts processing) a 5xx or
+    a timeout may mean the request went through, so only 429 and connect
+    timeouts (raised before anything was sent) are retried.
+
+    A 401 drops the cached SSO tokens and retries once, so ``send`` should
+    fetch its token on every call. Retry-After is honoured when present,
+    otherwise the wait doubles from ``backoff`` seconds. The last response is
+    returned as-is (callers keep their own success checks).
+    """
+    limiter = limiter or upload_rate_limiter
+    retry_status_codes = RETRY_STATUS_CODES if idempotent else NON_IDEMPOTENT_RETRY_STATUS_CODES
+    retry_errors = (requests.ConnectionError, requests.Timeout) if idempotent else (requests.ConnectTimeout,)
+    refreshed_token = False
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            response = send()
+        except retry_errors as e:
+            if attempt >= max_retries:
+                raise
+            wait = _retry_wait(None, attempt, backoff)
+            print(f"      Connection error ({e.__class__.__name__}), retrying in {wait:.1f}s")
+        else:
+            if response.status_code == 401 and not refreshed_token:
+                invalidate_api_tokens()
+                refreshed_token = True
+                continue
+            if response.status_code not in retry_status_codes or attempt >= max_retries:
+                return response
+            wait = _retry_wait(response, attempt, backoff)
+            print(f"      HTTP {response.status_code}, retrying in {wait:.1f}s "
+                  f"(attempt {attempt + 1}/{max_retries})")
+        time.sleep(wait)
+        attempt += 1
+
+
+def poll_with_backoff(send, is_pending, limiter=None, timeout=POLL_TIMEOUT_SECONDS,
+                      initial_wait=POLL_INITIAL_WAIT_SECONDS, max_wait=POLL_MAX_WAIT_SECONDS):
+    """
+    Call ``send()`` through send_with_retry() until ``is_pending(response)``
+    is False or ``timeout`` seconds have passed.
+
+    Waits start at ``initial_wait`` and double up to ``max_wait`` (with a
+    little jitter), so a result that is ready quickly is picked up quickly
+    and a slow one is not hammered. The last response is returned as-is.
+    """
+    start = time.monotonic()
+    wait = initial_wait
+    while True:
+        response = send_with_retry(send, limiter=limiter)
+        if not is_pending(response):
+            return response
+        if time.monotonic() - start + wait > timeout:
+            print(f"      Still pending after {time.monotonic() - start:.0f}s (HTTP {response.status_code})")
+            return response
+        time.sleep(wait + random.uniform(0, 0.25))
+        wait = min(wait * 2, max_wait)
+
+
+def run_per_cohort(jobs, max_workers=UPLOAD_MAX_WORKERS):
+    """
+    Run one upload job per cohort concurrently.
+
+    Args:
+        jobs: {cohort_id: zero-arg callable}. Each callable uploads that
+              cohort's files in order; different cohorts run in parallel.
+        max_workers: Cohorts in flight at once (requests are additionally
+                     throttled by the shared upload_rate_limiter).
+
+    Returns:
+        {cohort_id: callable result, or the exception it raised}
+    """
+    if not jobs:
+        return {}
+    results = {}
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+        futures = {pool.submit(job): cohort for cohort, job in jobs.items()}
+        for future in as_completed(futures):
+            cohort = futures[future]
+            try:
+                results[cohort] = future.result()
+            except Exception as e:
+                print(f"    Cohort {cohort} upload error: {e}")
+                results[cohort] = e
+    print(f"  Uploaded {len(jobs)} cohorts in {time.time() - start:.1f}s "
+          f"(max {max_workers} concurrent, {upload_rate_limiter.rate or 'unlimited'} req/s)")
+    return results
@@ -0,0 +1,8 @@
+"""Repo-root modules (tier_store, grouped_quantiles, db, ...) are imported directly by the tests."""
+
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
@@ -0,0 +1,68 @@
+"""
+Load function / class / constant definitions from the pipeline notebooks so
+their engines can be tested offline.
+
+Only top-level ``def`` / ``class`` statements, imports and constant
+assignments (no calls on the right-hand side) are executed; query, upload and
+API cells never run. Names that cannot be resolved offline (a failing import,
+a constant built from a missing name) are skipped.
+
+    ns = load_notebook_definitions('modules/queries_module.ipynb',
+                                   'modules/module_2_initial_price_push.ipynb')
+    ns['generate_initial_price_push_batch'](df, ns['PercentileIndex'](df_perc))
+"""
+
+import ast
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def _code_cells(path):
+    with open(os.path.join(REPO_DIR, path)) as f:
+        nb = json.load(f)
+    for cell in nb['cells']:
+        if cell['cell_type'] != 'code':
+            continue
+        # IPython magics / shell lines (%run, !pip) are not Python; `pass` keeps
+        # an enclosing block (if os.path.exists(...): %run ...) valid
+        lines = [line[:len(line) - len(line.lstrip())] + 'pass\n'
+                 if line.lstrip().startswith(('%', '!')) else line
+                 for line in cell['source']]
+        yield ''.join(lines)
+
+
+def _is_definition(node):
+    if isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom)):
+        return True
+    if isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) for t in node.targets):
+        return not any(isinstance(n, ast.Call) for n in ast.walk(node.value))
+    return False
+
+
+def load_notebook_definitions(*paths, namespace=None):
+    """Exec the definitions of ``paths`` (repo-relative, in order) into one namespace."""
+    ns = {'__name__': 'notebook_defs', 'np': np, 'pd': pd}
+    if namespace:
+        ns.update(namespace)
+    for path in paths:
+        for source in _code_cells(path):
+            try:
+                tree = ast.parse(source)
+            except SyntaxError:
+                continue
+            for node in tree.body:
+                if not _is_definition(node):
+                    continue
+                try:
+                    exec(compile(ast.Module([node], []), path, 'exec'), ns)
+                except (ImportError, NameError, KeyError, AttributeError):
+                    pass
+    return ns
@@ -0,0 +1,102 @@
+"""
+grouped_quantiles vs a per-group np.percentile / weighted_median reference on
+seeded frames, plus the NaN semantics (NaN values skipped, not propagated).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from grouped_quantiles import grouped_counts, grouped_quantiles
+from notebook_defs import load_notebook_definitions
+
+QUANTILES = {'perc_0': 0, 'perc_15': 15, 'perc_25': 25, 'perc_50': 50, 'perc_75': 75,
+             'perc_95': 95, 'perc_100': 100}
+
+
+def weighted_median_reference(values, weights, q=50):
+    """First value whose cumulative weight reaches q% of the total (stable sort)."""
+    order = np.argsort(values, kind='mergesort')
+    cumsum = np.cumsum(weights[order])
+    idx = min(np.searchsorted(cumsum, cumsum[-1] * q / 100), len(values) - 1)
+    return values[order][idx]
+
+
+@pytest.fixture(scope='module')
+def df_random():
+    rng = np.random.default_rng(7)
+    n = 2000
+    return pd.DataFrame({
+        'brand': rng.choice(['b1', 'b2', 'b3', 'b4'], n),
+        'region': rng.choice(['Cairo', 'Giza', 'Alexandria'], n),
+        # rounded values -> many ties inside a group
+        'margin': np.round(rng.normal(0.1, 0.05, n), 3),
+        'price': rng.choice([9.0, 9.25, 9.5, 10.0, 11.0], n),
+        'cntrb': rng.choice([0.0, 0.5, 1.0, 2.0, 3.5], n),
+    })
+
+
+def test_matches_np_percentile_per_group(df_random):
+    out = grouped_quantiles(df_random, ['brand', 'region'], 'margin', QUANTILES)
+    expected = df_random.groupby(['brand', 'region']).agg(
+        **{name: ('margin', lambda v, q=q: np.percentile(v, q)) for name, q in QUANTILES.items()}
+    ).reset_index()
+    pd.testing.assert_frame_equal(out, expected, check_exact=True)
+
+
+def test_small_and_single_value_groups():
+    df = pd.DataFrame({'g': ['a', 'b', 'b', 'c', 'c', 'c'], 'x': [5.0, 1.0, 3.0, 2.0, 2.0, 7.0]})
+    out = grouped_quantiles(df, 'g', 'x', {'p25': 25, 'p50': 50})
+    expected = df.groupby('g').agg(p25=('x', lambda v: np.percentile(v, 25)),
+                                   p50=('x', lambda v: np.percentile(v, 50))).reset_index()
+    pd.testing.assert_frame_equal(out, expected, check_exact=True)
+
+
+def test_weighted_matches_weighted_median(df_random):
+    out = grouped_quantiles(df_random, 'brand', ['price', 'margin'], {'{col}_w50': 50, '{col}_w80': 80},
+                            weights='cntrb')
+    for _, row in out.iterrows():
+        group = df_random[df_random['brand'] == row['brand']]
+        for col in ['price', 'margin']:
+            values, weights = group[col].to_numpy(), group['cntrb'].to_numpy()
+            assert row[f'{col}_w50'] == weighted_median_reference(values, weights, 50)
+            assert row[f'{col}_w80'] == weighted_median_reference(values, weights, 80)
+
+
+def test_weighted_median_matches_market_data_module(df_random):
+    weighted_median = load_notebook_definitions('modules/market_data_module.ipynb')['weighted_median']
+    out = grouped_quantiles(df_random, ['brand', 'region'], 'price', {'wm': 50}, weights='cntrb')
+    expected = [weighted_median(group['price'], group['cntrb'])
+                for _, group in df_random.groupby(['brand', 'region'])]
+    np.testing.assert_array_equal(out['wm'].to_numpy(), expected)
+
+
+def test_nan_values_are_skipped_not_propagated():
+    df = pd.DataFrame({
+        'g': ['a', 'a', 'a', 'a', 'b', 'b', 'c'],
+        'x': [1.0, np.nan, 3.0, 5.0, np.nan, np.nan, 4.0],
+    })
+    out = grouped_quantiles(df, 'g', 'x', {'p50': 50, 'p25': 25})
+
+    # 'a': quantiles of [1, 3, 5] (np.percentile on the raw group would be NaN)
+    assert np.isnan(np.percentile(df.loc[df['g'] == 'a', 'x'], 50))
+    assert out.loc[0, 'p50'] == np.percentile([1.0, 3.0, 5.0], 50)
+    assert out.loc[0, 'p25'] == np.percentile([1.0, 3.0, 5.0], 25)
+    # 'b': no valid value -> NaN, row kept
+    assert out.loc[1, 'g'] == 'b' and np.isnan(out.loc[1, 'p50'])
+    assert out.loc[2, 'p50'] == 4.0
+    # same result as pandas' NaN-skipping quantile
+    expected = df.groupby('g')['x'].quantile(0.5).to_numpy()
+    np.testing.assert_array_equal(out['p50'].to_numpy(), expected)
+    np.testing.assert_array_equal(grouped_counts(df, 'g', 'x'), [3, 0, 1])
+
+
+def test_nan_weight_skips_row_and_nan_key_dropped():
+    df = pd.DataFrame({
+        'g': ['a', 'a', 'a', None],
+        'x': [1.0, 2.0, 3.0, 9.0],
+        'w': [1.0, np.nan, 1.0, 1.0],
+    })
+    out = grouped_quantiles(df, 'g', 'x', {'w50': 50}, weights='w')
+    assert list(out['g']) == ['a']
+    assert out.loc[0, 'w50'] == weighted_median_reference(np.array([1.0, 3.0]), np.array([1.0, 1.0]))
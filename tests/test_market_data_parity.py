@@ -0,0 +1,99 @@
+"""
+market_data_module_2: vectorized expansion stages vs their *_loop reference
+implementations on small fixture frames (partial region coverage, chained
+fallbacks, unmapped regions, empty / single / NaN tier lists).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from notebook_defs import load_notebook_definitions
+
+# product 1: Cairo only (Giza, Upper Egypt borrow it; Alexandria via rank 3)
+# product 2: Delta West + Giza, two rows each (Delta East, Alexandria, Cairo,
+#            Upper Egypt borrow; row order within a region must be kept)
+# product 3: every region present -> nothing borrowed
+# product 4: unknown region only -> no fallback reaches it
+# product 5: first and last row of the frame (output follows first appearance)
+# product 6: Upper Egypt only, which no other region falls back to
+PRICES = pd.DataFrame([
+    (5, 'Alexandria', 12.0, 'marketplace'),
+    (1, 'Cairo', 10.0, 'marketplace'),
+    (2, 'Delta West', 20.0, 'scrapped'),
+    (2, 'Giza', 21.0, 'scrapped'),
+    (2, 'Delta West', 20.5, 'marketplace'),
+    (2, 'Giza', np.nan, 'marketplace'),
+    *[(3, region, 30.0, 'marketplace') for region in
+      ['Cairo', 'Giza', 'Alexandria', 'Delta East', 'Delta West', 'Upper Egypt']],
+    (4, 'Sinai', 40.0, 'marketplace'),
+    (6, 'Upper Egypt', 60.0, 'scrapped'),
+    (5, 'Delta East', 12.5, 'scrapped'),
+], columns=['product_id', 'region', 'price', 'source'])
+
+BEN = pd.DataFrame({'product_id': [1, 2, 7], 'price': [10.0, np.nan, 70.0]})
+BEN_INHOUSE = pd.DataFrame({'product_id': [2], 'price': [19.5]})
+
+MARKET = pd.DataFrame({
+    'product_id': [1, 2, 3, 4, 5],
+    'region': ['Upper Egypt', 'Cairo', 'Sinai', 'Delta East', 'Upper Egypt'],
+    'market_min': [9.0, 10.0, 11.0, np.nan, 13.0],
+    'price_tiers': [[9.0, 10.0], [10.0], [], [12.0, 12.5], [13.0]],
+})
+
+V2 = pd.DataFrame({
+    'product_id': [1, 2, 3, 4, 5, 6, 7],
+    'region': ['Cairo', 'Giza', 'Cairo', 'Alexandria', 'Delta East', 'Upper Egypt', 'Cairo'],
+    'wac_p': [8.0, 9.0, 10.0, np.nan, 0.0, 5.0, 4.0],
+    'price_tiers': [[9.0, 9.5, 10.0, 11.0], [10.25], [], [12.0, 12.5, 13.0],
+                    [0.0, 1.0], [5.0, 5.25, 5.5, 6.0, 7.5], [4.0, 4.0, 4.5]],
+    'market_data_source': ['sku', 'sku', 'sku', 'brand_fallback', 'sku', 'brand_fallback', 'sku'],
+})
+
+
+@pytest.fixture(scope='module')
+def ns():
+    return load_notebook_definitions('modules/queries_module.ipynb',
+                                     'modules/market_data_module_2.ipynb')
+
+
+def assert_parity(ns, df_vec, df_loop, label):
+    assert len(df_vec) == len(df_loop)
+    assert list(df_vec.columns) == list(df_loop.columns)
+    ns['check_engine_parity'](df_vec, df_loop, label=label)
+
+
+def test_apply_regional_fallback(ns):
+    df_vec = ns['apply_regional_fallback'](PRICES)
+    df_loop = ns['apply_regional_fallback_loop'](PRICES)
+    assert len(df_vec) > len(PRICES)
+    assert_parity(ns, df_vec, df_loop, 'apply_regional_fallback')
+
+
+def test_apply_regional_fallback_nothing_to_borrow(ns):
+    complete = PRICES[PRICES['product_id'].isin([3, 4])].reset_index(drop=True)
+    assert_parity(ns, ns['apply_regional_fallback'](complete),
+                  ns['apply_regional_fallback_loop'](complete), 'apply_regional_fallback')
+
+
+def test_expand_ben_to_regions(ns):
+    assert_parity(ns, ns['expand_ben_to_regions'](BEN, BEN_INHOUSE),
+                  ns['expand_ben_to_regions_loop'](BEN, BEN_INHOUSE), 'expand_ben_to_regions')
+
+
+def test_expand_to_cohorts(ns):
+    df_vec = ns['expand_to_cohorts'](MARKET)
+    df_loop = ns['expand_to_cohorts_loop'](MARKET)
+    assert len(df_vec) == 4 + 1 + 1 + 4   # Upper Egypt x4, Cairo, Delta East, Upper Egypt x4; Sinai dropped
+    assert_parity(ns, df_vec, df_loop, 'expand_to_cohorts')
+
+
+@pytest.mark.parametrize('columns', [
+    ['product_id', 'region', 'wac_p', 'price_tiers', 'market_data_source'],
+    ['product_id', 'region', 'wac_p', 'price_tiers'],
+])
+def test_tiers_to_percentiles(ns, columns):
+    df_v2 = V2[columns]
+    df_vec = ns['tiers_to_percentiles'](df_v2)
+    df_loop = ns['tiers_to_percentiles_loop'](df_v2)
+    assert_parity(ns, df_vec, df_loop, 'tiers_to_percentiles')
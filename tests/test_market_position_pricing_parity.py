@@ -0,0 +1,180 @@
+"""
+market_position_pricing: vectorized optimizer (optimize_v2) vs the per-row
+reference (optimize_v2_loop) on a seeded lookup frame. Rows are drawn from
+small pools (sales / margin / none pools, below_min, missing price or WAC,
+market vs margin-tier ladders, SKUs with and without own history) and a block
+of rows is repeated so Phase C efficiencies tie and the heap has to keep
+lookup order. The NMV target is set so Phase C is skipped, stops part way
+through the heap, or takes every drop.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from notebook_defs import load_notebook_definitions
+
+N_ROWS = 400
+N_REPEATED = 80
+SEED = 20240620
+
+POSITIONS = ['min', '25', '50', '75', 'max', 'Target']
+
+# (price_tiers, market_min, market_25, market_50, market_75, market_max)
+MARKETS = [
+    ([9.0, 9.5, 10.0, 10.5, 11.0, 12.0, 13.0], 9.0, 9.5, 10.0, 11.0, 12.0),
+    ([8.0, 8.5, 9.0, 9.25, 12.0], 8.0, 8.5, 9.0, 9.25, 12.0),
+    ([10.0], 10.0, 10.0, 10.0, 10.0, 10.0),
+    ([9.0, 10.0, 11.0], np.nan, np.nan, np.nan, np.nan, np.nan),
+    ([], np.nan, np.nan, np.nan, np.nan, np.nan),
+]
+
+POOLS = {
+    'cohort_id': [700, 701],
+    'product_id': [1, 2, 3, 4, 5, 6],
+    'market': list(range(len(MARKETS))),
+    'current_price': [9.0, 9.5, 10.0, 10.75, 12.0, 13.5, np.nan],
+    'wac_p': [7.0, 8.0, 8.0, 9.5, 0.0],
+    'commercial_min_price': [0.0, 0.0, np.nan, 9.25],
+    'margin_tier_1': [0.05, 0.1, np.nan],
+    'margin_tier_2': [0.15, np.nan],
+    'margin_tier_3': [0.2, 0.3],
+    'margin_tier_4': [0.35, np.nan],
+    'margin_tier_5': [0.4, 1.0],
+    'sku_nmv_anchor': [0.0, 100.0, 250.0, 1000.0],
+    'last7_avg_daily_nmv': [0.0, 50.0, 300.0],
+    'nmv_30d': [0.0, 3000.0, 9000.0],
+    'qty_ratio': [0.5, 1.0, 1.6, 2.5, np.nan],
+    'is_bottom_quartile': [False, True],
+    'is_top50_cum': [False, False, True],
+}
+
+# avg_daily_nmv per (cohort, product, position); repeated values -> ties in
+# the sales-max argmax and in candidate NMVs
+SALES_NMV = [100.0, 200.0, 200.0, 400.0, 800.0, np.nan]
+
+PRODUCTS = pd.DataFrame({
+    'product_id': [1, 2, 3, 4, 5, 6],
+    'brand': ['b1', 'b1', 'b2', 'b2', 'b3', 'b3'],
+    'cat': ['c1', 'c1', 'c1', 'c2', 'c2', 'c2'],
+})
+
+
+def draw(pools, rng, n):
+    return pd.DataFrame({name: [pool[i] for i in rng.integers(len(pool), size=n)]
+                         for name, pool in pools.items()})
+
+
+def set_position_lookups(ns, sales_by_pos, df_products):
+    """The Cell 6b lookups both optimizers read (dicts for the loop, key
+    arrays for the vector version), built the same way the notebook does."""
+    ns['sbp_sku'] = sales_by_pos.set_index(
+        ['cohort_id', 'product_id', 'price_position'])['avg_daily_nmv'].to_dict()
+    sbp_cb = (sales_by_pos.merge(df_products[['product_id', 'brand', 'cat']], on='product_id', how='left')
+              .groupby(['cat', 'brand', 'price_position'], as_index=False)['avg_daily_nmv'].mean())
+    sbp_cb['cb_pool_avg'] = sbp_cb.groupby(['cat', 'brand'])['avg_daily_nmv'].transform('mean')
+    sbp_cb['position_index'] = sbp_cb['avg_daily_nmv'] / sbp_cb['cb_pool_avg'].replace(0, np.nan)
+    ns['cb_position_index'] = sbp_cb.set_index(['cat', 'brand', 'price_position'])['position_index'].to_dict()
+
+    ns['SKU_POSITION_INDEX'] = pd.MultiIndex.from_arrays([
+        sales_by_pos['cohort_id'].astype(float),
+        sales_by_pos['product_id'].astype(float),
+        sales_by_pos['price_position'].astype(str),
+    ])
+    ns['SKU_POSITION_NMV'] = sales_by_pos['avg_daily_nmv'].to_numpy(dtype=float)
+    ns['CB_POSITION_INDEX'] = pd.MultiIndex.from_frame(sbp_cb[['cat', 'brand', 'price_position']])
+    ns['CB_POSITION_VALUES'] = sbp_cb['position_index'].to_numpy(dtype=float)
+    own_nmv = sales_by_pos[sales_by_pos['avg_daily_nmv'].notna()]
+    sales_max = own_nmv.loc[own_nmv.groupby(['cohort_id', 'product_id'], sort=False)['avg_daily_nmv'].idxmax()]
+    ns['SALES_MAX_INDEX'] = pd.MultiIndex.from_arrays([
+        sales_max['cohort_id'].astype(float), sales_max['product_id'].astype(float),
+    ])
+    ns['SALES_MAX_POSITIONS'] = sales_max['price_position'].to_numpy(dtype=object)
+
+
+@pytest.fixture(scope='module')
+def ns():
+    ns = load_notebook_definitions('modules/queries_module.ipynb', 'market_position_pricing.ipynb')
+    rng = np.random.default_rng(SEED)
+    # Some (cohort, product) pairs have no own history (product 6 in cohort 701)
+    records = [(c, p, pos, SALES_NMV[rng.integers(len(SALES_NMV))])
+               for c in (700, 701) for p in range(1, 7) if (c, p) != (701, 6)
+               for pos in POSITIONS if rng.random() < 0.7]
+    sales_by_pos = pd.DataFrame(records, columns=['cohort_id', 'product_id', 'price_position', 'avg_daily_nmv'])
+    set_position_lookups(ns, sales_by_pos, PRODUCTS)
+    return ns
+
+
+@pytest.fixture(scope='module')
+def lookup(ns):
+    rng = np.random.default_rng(SEED + 1)
+    df = draw(POOLS, rng, N_ROWS)
+    market = [MARKETS[i] for i in df.pop('market')]
+    df['price_tiers'] = [list(m[0]) for m in market]
+    for k, col in enumerate(['market_min', 'market_25', 'market_50', 'market_75', 'market_max'], start=1):
+        df[col] = [m[k] for m in market]
+    df['margin_tier_above_1'], df['margin_tier_above_2'] = 0.45, np.nan
+    df = df.merge(PRODUCTS, on='product_id', how='left')
+    # Repeated rows: identical best drops -> equal heap keys in Phase C
+    df = pd.concat([df, df.iloc[:N_REPEATED]], ignore_index=True)
+
+    df['position'] = df.apply(ns['derive_position'], axis=1)
+    df[['sales_or_margin', 'reason_v2']] = df.apply(
+        lambda r: pd.Series(ns['classify_row'](r), index=['sales_or_margin', 'reason_v2']), axis=1)
+    df['new_price_v2'] = np.nan
+    df['delta_nmv_v2'] = np.nan
+    df['delta_profit_v2'] = np.nan
+    return df
+
+
+def run_both(ns, lookup, target_offset):
+    ns['NMV_TARGET'] = float(lookup['last7_avg_daily_nmv'].sum()) + target_offset
+    df_vec, vec_dnmv, vec_dprofit = ns['optimize_v2'](lookup.copy())
+    df_loop, loop_dnmv, loop_dprofit = ns['optimize_v2_loop'](lookup.copy())
+    return df_vec, df_loop, (vec_dnmv, vec_dprofit), (loop_dnmv, loop_dprofit)
+
+
+def phase_c_queue(df):
+    """Phase C drops of a run in pop order (efficiency desc, ties in row
+    order) as (row labels, efficiencies, delta_nmv)."""
+    p3 = df['reason_v2'].str.startswith('p3_close_gap')
+    dnmv = df.loc[p3, 'delta_nmv_v2'].to_numpy()
+    dprofit = df.loc[p3, 'delta_profit_v2'].to_numpy()
+    eff = np.where(dprofit < 0, dnmv / np.maximum(-dprofit, 1e-6), np.inf)
+    order = np.argsort(-eff, kind='stable')
+    return df.index[p3][order], eff[order], dnmv[order]
+
+
+@pytest.fixture(scope='module')
+def tie_cut(ns, lookup):
+    """Target offset that closes the gap right after the first of two drops
+    with equal efficiency, so the heap has to pop tied entries in row order."""
+    df_full, _, (full_dnmv, _), _ = run_both(ns, lookup, 1e12)
+    rows, eff, dnmv = phase_c_queue(df_full)
+    j = np.flatnonzero(eff[1:] == eff[:-1])[0]
+    dnmv_ab = full_dnmv - dnmv.sum()
+    gap = np.cumsum(dnmv)[j] - dnmv[j] / 2
+    return dnmv_ab + gap, rows[j], rows[j + 1], j + 1
+
+
+@pytest.mark.parametrize('target', ['reached', 'tie_cut', 'unreachable'])
+def test_optimize_v2_matches_loop(ns, lookup, tie_cut, target):
+    target_offset = {'reached': -1.0, 'tie_cut': tie_cut[0], 'unreachable': 1e12}[target]
+    df_vec, df_loop, vec_totals, loop_totals = run_both(ns, lookup, target_offset)
+    assert len(df_vec) == len(df_loop) == len(lookup)
+    assert list(df_vec.columns) == list(df_loop.columns)
+    columns = ns['V2_OUTPUT_COLUMNS']
+    ns['check_engine_parity'](df_vec[columns], df_loop[columns], label='v2 optimizer')
+    assert vec_totals == loop_totals
+
+
+def test_phase_c_pops_ties_in_row_order(ns, lookup, tie_cut):
+    target_offset, first, second, n_taken = tie_cut
+    assert first < second
+    df_vec = run_both(ns, lookup, target_offset)[0]
+    p3 = df_vec['reason_v2'].str.startswith('p3_close_gap')
+    assert p3.sum() == n_taken
+    assert p3[first] and not p3[second]
+    # the repeated block ties every drop it contains with its original row
+    full_p3 = run_both(ns, lookup, 1e12)[0]['reason_v2'].str.startswith('p3_close_gap')
+    assert (full_p3.iloc[:N_REPEATED].to_numpy() & full_p3.iloc[N_ROWS:].to_numpy()).any()
@@ -0,0 +1,125 @@
+"""
+Module 2: vectorized engine (generate_initial_price_push_batch) vs the
+per-row engine (run_row_engine) on a fixture frame covering every case
+(OOS, zero demand, low stock, normal + market signals) with NaN, zero-demand
+and boundary rows.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from notebook_defs import load_notebook_definitions
+
+TIERS = [9.0, 9.5, 9.75, 10.25, 10.5, 11.0]
+
+BASE_ROW = {
+    'warehouse_id': 1, 'cohort_id': 700, 'sku': 'sku', 'brand': 'brand', 'cat': 'cat',
+    'abc_class': 'B', 'current_price': 10.0, 'current_cart_rule': 20, 'wac_p': 8.0,
+    'stocks': 100, 'combined_status': 'On Track', 'yesterday_status': 'On Track',
+    'zero_demand': 0, 'sensitivity': 'medium', 'doh': 10.0, 'target_margin': 0.1,
+    'commercial_min_price': np.nan, 'effective_tiers': TIERS, 'trend_signal': 'NEUTRAL',
+    'data_points_30d': 0, 'volatility_pct': np.nan, 'commercial_price_up_pct': 0.0,
+    'normal_refill': 5,
+}
+
+CASES = [
+    # CASE 1: out of stock, ABC percentile of the ladder
+    {'stocks': 0, 'abc_class': 'A'},
+    {'stocks': 0, 'abc_class': 'B'},
+    {'stocks': 0, 'abc_class': ' c '},
+    {'stocks': 0, 'abc_class': 'A', 'effective_tiers': []},
+    {'stocks': 0, 'current_price': np.nan},
+    # CASE 2: zero demand
+    {'zero_demand': 1, 'yesterday_status': 'Critical'},
+    {'zero_demand': 1, 'yesterday_status': 'Critical', 'commercial_min_price': 9.6},
+    {'zero_demand': 1, 'yesterday_status': 'No Data', 'current_price': 9.2},
+    {'zero_demand': 1, 'yesterday_status': 'Star Performer'},
+    {'zero_demand': 1, 'yesterday_status': 'On Track', 'commercial_min_price': 0},
+    {'zero_demand': 1, 'yesterday_status': 'Critical', 'effective_tiers': []},
+    {'zero_demand': 1, 'yesterday_status': 'Critical', 'current_price': np.nan},
+    # CASE 2.5: low stock (DOH boundary = LOW_STOCK_DOH_THRESHOLD)
+    {'doh': 1.0, 'combined_status': 'On Track'},
+    {'doh': 1.0, 'combined_status': 'Star Performer', 'current_price': 10.75},
+    {'doh': 0.5, 'combined_status': 'Critical'},
+    {'doh': np.nan, 'combined_status': 'Critical', 'yesterday_status': 'Critical'},
+    # CASE 3: status combinations
+    {'combined_status': 'On Track', 'yesterday_status': 'Star Performer'},
+    {'combined_status': 'Star Performer', 'yesterday_status': 'Star Performer', 'current_price': 11.5},
+    {'combined_status': 'Over Achiever', 'yesterday_status': 'Star Performer', 'current_price': 11.5},
+    {'combined_status': 'Over Achiever', 'yesterday_status': 'On Track'},
+    {'combined_status': 'Critical', 'yesterday_status': 'Underperforming'},
+    {'combined_status': 'Critical', 'yesterday_status': 'Struggling', 'commercial_min_price': 9.9},
+    {'combined_status': 'Critical', 'yesterday_status': 'Critical', 'current_price': 9.0},
+    {'combined_status': 'Critical', 'yesterday_status': 'Star Performer'},
+    {'combined_status': 'Star Performer', 'yesterday_status': 'Critical'},
+    {'combined_status': 'Critical', 'yesterday_status': 'On Track'},
+    {'combined_status': 'No Data', 'yesterday_status': 'Critical'},
+    {'combined_status': 'Unknown', 'yesterday_status': 'Unknown'},
+    # NaN / zero inputs on the standard path
+    {'combined_status': 'Critical', 'yesterday_status': 'Critical', 'current_price': np.nan},
+    {'combined_status': 'Star Performer', 'yesterday_status': 'Star Performer', 'wac_p': np.nan,
+     'current_price': 11.5},
+    {'combined_status': 'Star Performer', 'yesterday_status': 'Star Performer', 'target_margin': np.nan,
+     'current_price': 11.5},
+    {'combined_status': 'On Track', 'yesterday_status': 'Star Performer', 'current_price': 0.0},
+    # Market signal boundaries (>= 10 data points, volatility <= 5, price-up 5% / 15%)
+    {'combined_status': 'On Track', 'yesterday_status': 'Star Performer', 'trend_signal': 'UPTREND',
+     'data_points_30d': 10, 'volatility_pct': 5.0},
+    {'combined_status': 'On Track', 'yesterday_status': 'Star Performer', 'trend_signal': 'UPTREND',
+     'data_points_30d': 9, 'volatility_pct': 1.0},
+    {'combined_status': 'Over Achiever', 'yesterday_status': 'Star Performer', 'trend_signal': 'STRONG UPTREND',
+     'data_points_30d': 30, 'volatility_pct': 5.01},
+    {'combined_status': 'Over Achiever', 'yesterday_status': 'On Track', 'commercial_price_up_pct': 0.05},
+    {'combined_status': 'Star Performer', 'yesterday_status': 'Star Performer', 'commercial_price_up_pct': 0.15},
+    {'combined_status': 'Critical', 'yesterday_status': 'Star Performer', 'commercial_price_up_pct': 0.049},
+    # Boost at the top of the ladder -> above-market fallback chain
+    {'combined_status': 'Star Performer', 'yesterday_status': 'Star Performer', 'trend_signal': 'UPTREND',
+     'data_points_30d': 20, 'current_price': 11.0},
+    {'combined_status': 'Star Performer', 'yesterday_status': 'Star Performer', 'trend_signal': 'UPTREND',
+     'data_points_30d': 20, 'current_price': 11.0, 'effective_tiers': [11.0]},
+    {'combined_status': 'Star Performer', 'yesterday_status': 'Star Performer', 'trend_signal': 'UPTREND',
+     'data_points_30d': 20, 'current_price': 11.0, 'effective_tiers': [], 'target_margin': 0},
+    # Cart-rule percentiles: missing cohort, NaN / zero percentile columns
+    {'cohort_id': 999},
+    {'product_id': 3, 'combined_status': 'Star Performer', 'yesterday_status': 'Star Performer'},
+    {'product_id': 3, 'stocks': 0},
+    {'product_id': 4, 'doh': 0.0, 'combined_status': 'Critical'},
+]
+
+PERCENTILES = pd.DataFrame({
+    'cohort_id': [700, 700, 700, 700],
+    'product_id': [1, 2, 3, 4],
+    'perc_25': [8.0, 3.0, 5.0, 2.0],
+    'perc_50': [12.4, 5.5, 7.0, 0.0],
+    'perc_75': [20.0, 9.0, 9.0, 4.0],
+    'perc_95': [40.6, 700.0, np.nan, 6.0],
+    'layer_1': [25.5, 2.0, 0.0, np.nan],
+    'layer_2': [30.0, 4.0, 0.0, np.nan],
+    'layer_3': [35.0, 6.0, 0.0, np.nan],
+})
+
+
+@pytest.fixture(scope='module')
+def ns():
+    return load_notebook_definitions('modules/queries_module.ipynb',
+                                     'modules/module_2_initial_price_push.ipynb')
+
+
+@pytest.fixture(scope='module')
+def df_fixture():
+    rows = []
+    for i, case in enumerate(CASES):
+        row = dict(BASE_ROW, product_id=1 + i % 2)
+        row.update(case)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def test_batch_engine_matches_row_engine(ns, df_fixture):
+    percentile_index = ns['percentile_index'] = ns['PercentileIndex'](PERCENTILES)
+    df_vec = ns['generate_initial_price_push_batch'](df_fixture, percentile_index)
+    df_loop = ns['run_row_engine'](df_fixture)   # reads the notebook-global percentile_index
+    assert len(df_vec) == len(df_loop) == len(df_fixture)
+    assert list(df_vec.columns) == list(df_loop.columns)
+    ns['check_engine_parity'](df_vec, df_loop, label='Module 2 engine')
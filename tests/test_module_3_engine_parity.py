@@ -0,0 +1,118 @@
+"""
+Module 3: vectorized engine (generate_periodic_actions_batch) vs the per-row
+engine (run_row_engine) on a seeded fixture frame. Column values are drawn
+from small pools that sit on the UTH / price / DOH thresholds and include
+NaN and zero, so every case (OOS, Zero Demand, High DOH, Low Stock,
+On Track, Growing, Dropping) is exercised together with its boundaries.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from notebook_defs import load_notebook_definitions
+
+N_ROWS = 800
+SEED = 20240601
+
+TIERS = [9.0, 9.5, 9.75, 10.25, 10.5, 11.0]
+
+# p80 = 10, p70 = 10, avg_uth_pct = 0.5 -> qty / retailer targets of 5, so
+# uth_qty 4 / 4.5 / 5.5 / 6 land exactly on the 0.8 / 0.9 / 1.1 / 1.2 ratios.
+# Columns the notebook fills before the engine runs (uth_qty, avg_uth_pct,
+# in-stock contributions, qtr_cntrb, target_margin, commercial_min_price,
+# closing stock, min_induced_price) carry no NaN here either.
+POOLS = {
+    'cohort_id': [700, 701],
+    'product_id': [1, 2, 3, 4],
+    'stocks': [0, 1, 50, 500, 500, 5000, 5000],
+    'below_min_stock_flag': [0, 0, 0, 0, 0, 1],
+    'zero_demand': [0, 0, 1],
+    'closing_stock_yesterday': [0, 10],
+    'uth_qty': [0, 1, 4, 4.5, 5, 5.5, 6, 7, 12],
+    'uth_retailers': [0, 2, 4, 4.5, 5, 5.5, 6, 7, 12],
+    'p80_daily_240d': [10, 10, 0, np.nan],
+    'p70_daily_retailers_240d': [10, 10, 0],
+    'avg_uth_pct': [0.5, 0.5, 0.4],
+    'in_stock_contribution_qty': [0.5, 0.3, 0.6],
+    'in_stock_contribution_ret': [0.5, 0.6, 0.3],
+    'qtr_cntrb': [1.0, 1.2],
+    'target_qty': [np.nan, np.nan, 8, 30],
+    'current_price': [10.0, 10.25, 9.0, 11.0, 12.0, 0],
+    'wac_p': [8.0, 9.5, 0],
+    'target_margin': [0.1, 0.2, 0],
+    'min_boundary': [0.05, np.nan],
+    'current_cart_rule': [5, 20, 40, 300],
+    'normal_refill': [5, 12, np.nan],
+    'refill_stddev': [2, 0, np.nan],
+    'responsive_doh': [0.5, 1, 5, 30, 31, 999],
+    'doh': [1, 10, 40, np.nan],
+    'oos_yesterday': [0, 1],
+    'mtd_qty': [0, 100],
+    'reduced_count': [0, 2, 3],
+    'increase_count': [0, 1, 3],
+    'm4_increase_count': [0, 2],
+    'has_active_sku_discount': [0, 1],
+    'has_active_qd': [0, 1],
+    'recently_attempted_sku_disc': [0, 0, 1],
+    'recently_attempted_qd': [0, 0, 1],
+    'active_sku_disc_pct': [0, 2.5],
+    'sku_disc_cntrb_uth': [0, 30.0, np.nan],
+    't1_cntrb_uth': [0, 30.0, 45.0],
+    't2_cntrb_uth': [0, 20.0],
+    't3_cntrb_uth': [0, 45.0],
+    'qd_tier_1_qty': [0, 3],
+    'qd_tier_1_disc_pct': [0, 1.0],
+    'qd_tier_2_qty': [0, 6],
+    'qd_tier_2_disc_pct': [0, 2.0],
+    'qd_tier_3_qty': [0, 12],
+    'qd_tier_3_disc_pct': [0, 3.0],
+    'commercial_min_price': [0, 0, 9.6],
+    'effective_tiers': [TIERS, TIERS, [10.0], []],
+    'margin_tier_1': [0.06, np.nan], 'margin_tier_2': [0.08, np.nan], 'margin_tier_3': [0.1, np.nan],
+    'margin_tier_4': [0.12], 'margin_tier_5': [0.14, np.nan],
+    'market_min': [9.0, np.nan], 'market_25': [9.5], 'market_50': [10.0, np.nan],
+    'market_75': [10.5], 'market_max': [11.0, np.nan],
+}
+
+PERCENTILES = pd.DataFrame({
+    'cohort_id': [700, 700, 700, 700],
+    'product_id': [1, 2, 3, 4],
+    'perc_25': [8.0, 3.0, 5.0, 2.0],
+    'perc_50': [12.4, 5.5, 7.0, 0.0],
+    'perc_75': [20.0, 9.0, 9.0, 4.0],
+    'perc_95': [40.6, 700.0, np.nan, 6.0],
+    'layer_1': [25.5, 2.0, 0.0, np.nan],
+    'layer_2': [30.0, 4.0, 0.0, np.nan],
+    'layer_3': [35.0, 6.0, 0.0, np.nan],
+})
+
+
+@pytest.fixture(scope='module')
+def ns():
+    return load_notebook_definitions('modules/queries_module.ipynb',
+                                     'modules/module_3_periodic_actions.ipynb')
+
+
+@pytest.fixture(scope='module')
+def df_fixture():
+    rng = np.random.default_rng(SEED)
+    columns = {}
+    for name, pool in POOLS.items():
+        picks = rng.integers(len(pool), size=N_ROWS)
+        columns[name] = [pool[i] for i in picks]
+    df = pd.DataFrame(columns)
+    df.insert(0, 'warehouse_id', np.arange(N_ROWS) // 4 + 1)
+    df['sku'], df['brand'], df['cat'] = 'sku', 'brand', 'cat'
+    df['min_induced_price'] = df['wac_p'] * 0.9
+    return df
+
+
+def test_batch_engine_matches_row_engine(ns, df_fixture):
+    percentile_index = ns['percentile_index'] = ns['PercentileIndex'](PERCENTILES)
+    ns['df_previous_actions'] = pd.DataFrame()
+    df_vec = ns['generate_periodic_actions_batch'](df_fixture, percentile_index)
+    df_loop = ns['run_row_engine'](df_fixture)   # reads the notebook-global percentile_index
+    assert len(df_vec) == len(df_loop) == len(df_fixture)
+    assert list(df_vec.columns) == list(df_loop.columns)
+    ns['check_engine_parity'](df_vec, df_loop, label='Module 3 engine')
@@ -0,0 +1,145 @@
+"""
+Module 4: vectorized pricing / cart stages vs the per-row helpers they
+replaced (RUN_ENGINE_PARITY_CHECK), row by row on seeded fixture frames.
+Column values are drawn from small pools around the tier, margin and
+percentile thresholds, with zero / negative WAC, empty ladders, missing
+margin tiers and unmatched percentile keys. NaN target_margin is checked on
+its own: smooth_price_increase raises there, the vector stage returns NaN.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from notebook_defs import load_notebook_definitions
+
+N_ROWS = 600
+SEED = 20240612
+
+# Sorted, distinct ladders (what effective_tiers holds after market data)
+LADDERS = [
+    [9.0, 9.5, 9.75, 10.25, 10.5, 11.0],
+    [8.25, 8.5, 12.0, 14.75],
+    [10.0],
+    [],
+    [8.0, 8.05, 8.1, 8.15, 8.2, 8.25, 8.3, 8.35, 8.4, 8.45, 13.0],   # >= 8 steps above wac
+]
+
+POOLS = {
+    'current_price': [10.0, 10.25, 9.0, 11.0, 12.0, 14.75, 0.0],
+    'wac_p': [8.0, 9.5, 10.5, 0.0, -1.0],
+    'new_wac': [8.0, 9.0, 9.75, 10.5, 0.0, np.nan],
+    'target_margin': [0.1, 0.2, 0.02, 0.0, 0.7],
+    'margin_tier_1': [0.05, 0.1, 0.2, 1.0, np.nan],
+    'effective_tiers': LADDERS,
+    'uth_qty_ratio': [0.0, 1.0, 2.5, np.nan],
+    'last_hour_qty_ratio': [0.0, 1.5, 3.0, np.nan],
+    'uth_rets_ratio': [0.0, 1.0, 2.5, np.nan],
+    'last_hour_rets_ratio': [0.0, 1.5, 3.0, np.nan],
+}
+
+MARGIN_POOLS = {
+    'wac_p': [8.0, 9.5, 0.0, -1.0, np.nan],
+    'margin_tier_1': [0.05, 0.1, np.nan, 0.0],
+    'margin_tier_2': [0.1, 0.15, np.nan],
+    'margin_tier_3': [0.15, 1.0, np.nan],
+    'margin_tier_4': [0.2, -0.1, np.nan],
+    'margin_tier_5': [0.25, 0.2, np.nan],
+    'margin_tier_above_1': [0.3, 0.999, np.nan],
+    'margin_tier_above_2': [0.35, 0.3, np.nan],
+}
+
+# perc_95 / 75 / 50 / 25 per key; carts sit on, next to (tolerance 2) and
+# away from each level
+PERCENTILES = pd.DataFrame({
+    'cohort_id': [700, 700, 700, 700],
+    'product_id': [1, 2, 3, 4],
+    'perc_25': [8.0, 3.0, 5.0, 2.0],
+    'perc_50': [12.4, 5.5, 7.0, 0.0],
+    'perc_75': [20.0, 9.0, 9.0, 4.0],
+    'perc_95': [40.6, 700.0, np.nan, 6.0],
+})
+
+CART_POOLS = {
+    'cohort_id': [700, 700, 701],
+    'product_id': [1, 2, 3, 4],
+    'current_cart_rule': [5, 8, 10, 12, 20, 22, 23, 40, 700, 300],
+    'uth_qty': [0, 10, 20, 21, 50, np.nan],
+    'uth_qty_target': [10, 5, 0, np.nan],
+}
+
+
+def draw_frame(pools, seed, n=N_ROWS):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, pool in pools.items():
+        picks = rng.integers(len(pool), size=n)
+        columns[name] = [pool[i] for i in picks]
+    return pd.DataFrame(columns)
+
+
+@pytest.fixture(scope='module')
+def ns():
+    return load_notebook_definitions('modules/queries_module.ipynb',
+                                     'modules/module_4_hourly_updates.ipynb')
+
+
+@pytest.fixture(scope='module')
+def df_fixture():
+    return draw_frame(POOLS, SEED)
+
+
+def test_smooth_price_increases(ns, df_fixture):
+    rng = np.random.default_rng(SEED + 1)
+    next_tier = rng.choice([9.0, 10.25, 10.5, 12.0, 30.0, np.nan], size=len(df_fixture))
+    vec = ns['smooth_price_increases'](df_fixture['current_price'].to_numpy(), df_fixture['wac_p'].to_numpy(),
+                                      df_fixture['target_margin'].to_numpy(), next_tier)
+    loop = [ns['smooth_price_increase'](row, next_tier[i]) for i, (_, row) in enumerate(df_fixture.iterrows())]
+    assert np.isfinite(vec).sum() > 0
+    ns['check_stage_parity'](vec, loop, 'smooth_price_increase')
+
+
+def test_smooth_price_increases_nan_target_margin(ns):
+    row = pd.Series({'current_price': 10.0, 'wac_p': 8.0, 'target_margin': np.nan})
+    with pytest.raises(ValueError):
+        ns['smooth_price_increase'](row, 11.0)
+    vec = ns['smooth_price_increases'](np.array([10.0, 10.0]), np.array([8.0, 8.0]),
+                                      np.array([np.nan, 0.1]), np.array([11.0, 11.0]))
+    assert np.isnan(vec[0])
+    assert vec[1] == ns['smooth_price_increase'](row.fillna(0.1), 11.0)
+
+
+def test_get_wac_increase_prices(ns, df_fixture):
+    tiers = ns['TierStore'].from_frame(df_fixture, 'effective_tiers', key_columns=None)
+    vec = ns['get_wac_increase_prices'](df_fixture, tiers)
+    loop = df_fixture.apply(ns['get_wac_increase_price'], axis=1)
+    assert np.isfinite(vec).sum() > 0
+    ns['check_stage_parity'](vec, loop, 'wac_increase')
+
+
+@pytest.mark.parametrize('hour', [0, 14, 23])
+@pytest.mark.parametrize('signal, helper', [('rets', 'get_rets_growing_price'), ('qty', 'get_qty_growing_price')])
+def test_get_growing_prices(ns, df_fixture, hour, signal, helper):
+    ns['CURRENT_HOUR'] = hour
+    tiers = ns['TierStore'].from_frame(df_fixture, 'effective_tiers', key_columns=None)
+    vec = ns['get_growing_prices'](df_fixture, tiers, signal)
+    loop = df_fixture.apply(ns[helper], axis=1)
+    ns['check_stage_parity'](vec, loop, f'{signal}_growing')
+
+
+def test_get_qty_growing_cart_rules(ns):
+    df = draw_frame(CART_POOLS, SEED + 2)
+    ns['percentile_index'] = ns['PercentileIndex'](PERCENTILES)
+    vec = ns['get_qty_growing_cart_rules'](df)
+    loop = df.apply(ns['get_qty_growing_cart_rule'], axis=1)
+    assert (vec.to_numpy() != df['current_cart_rule'].to_numpy()).any()
+    ns['check_stage_parity'](vec, loop, 'qty_growing_cart')
+
+
+@pytest.mark.parametrize('drop', [[], ['margin_tier_above_1', 'margin_tier_above_2']])
+def test_build_margin_tier_prices_batch(ns, drop):
+    df = draw_frame(MARGIN_POOLS, SEED + 3).drop(columns=drop)
+    vec = ns['build_margin_tier_prices_batch'](df)
+    loop = df.apply(ns['build_margin_tier_prices_m4'], axis=1)
+    assert vec.str.len().max() > 1
+    ns['check_stage_parity'](vec, loop, 'margin_tier_prices')
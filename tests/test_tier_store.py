@@ -0,0 +1,168 @@
+"""
+tier_store: the batch ladder kernels vs the list-based helpers in
+market_data_module_2 (subdivide_price_list / expand_single_price_margin_steps)
+on seeded ladders that include unsorted, duplicate, single and empty ones;
+the TierParquetWriter -> read_tier_parquet round trip; and the market-max
+ceiling clamp.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from notebook_defs import load_notebook_definitions
+from tier_store import (TierParquetWriter, TierStore, apply_market_max_ceiling, margin_step_ladders,
+                        read_tier_parquet, subdivide_ladders)
+
+N_ROWS = 400
+SEED = 20240715
+
+WACS = [8.0, 9.5, 10.0, 0.0, -1.0, np.nan]
+TARGET_MARGINS = [0.05, 0.1, 0.2, 0.0, -0.1, np.nan]
+
+
+@pytest.fixture(scope='module')
+def ns():
+    return load_notebook_definitions('modules/market_data_module_2.ipynb')
+
+
+@pytest.fixture(scope='module')
+def ladders():
+    """Seeded ladders on a 0.25 grid (shared values -> ties across rows),
+    some shuffled, some with repeated tiers, plus single and empty ones."""
+    rng = np.random.default_rng(SEED)
+    out = []
+    for _ in range(N_ROWS):
+        size = rng.choice([0, 1, 2, 3, 5, 8])
+        ladder = list(np.round(rng.uniform(6, 16, size) * 4) / 4)
+        if size > 1 and rng.random() < 0.3:
+            ladder += ladder[:2]                 # duplicates
+        if rng.random() < 0.5:
+            rng.shuffle(ladder)                  # unsorted
+        else:
+            ladder.sort()
+        out.append([float(p) for p in ladder])
+    return out
+
+
+def draw(pool, n, seed):
+    rng = np.random.default_rng(seed)
+    return np.array([pool[i] for i in rng.integers(len(pool), size=n)], dtype=float)
+
+
+def test_from_lists_sorts_and_keeps_empty(ladders):
+    store = TierStore.from_lists(ladders + [np.nan, None, [np.nan, 3.0]])
+    assert len(store) == N_ROWS + 3
+    assert store.to_lists() == [sorted(ladder) for ladder in ladders] + [[], [], [3.0]]
+    np.testing.assert_array_equal(store.lengths[N_ROWS:], [0, 0, 1])
+
+
+def test_subdivide_ladders_matches_subdivide_price_list(ns, ladders):
+    wac = draw(WACS, N_ROWS, SEED + 1)
+    target_margin = draw(TARGET_MARGINS, N_ROWS, SEED + 2)
+    store = subdivide_ladders(TierStore.from_lists(ladders), wac, target_margin, ns['MAX_MARGIN_GAP_PCT'])
+
+    n_split = 0
+    for i, ladder in enumerate(ladders):
+        # The helper expects a sorted ladder and returns it untouched when it
+        # does not subdivide; the kernel always returns sorted distinct tiers.
+        expected = sorted(set(ns['subdivide_price_list'](sorted(ladder), wac[i], target_margin[i])))
+        assert store.ladder(i) == expected, f'row {i}: {ladder}, wac={wac[i]}, tm={target_margin[i]}'
+        n_split += len(expected) > len(set(ladder))
+    assert n_split > 0
+
+
+def test_margin_step_ladders_matches_expand_single_price(ns):
+    n = 300
+    prices = draw([9.0, 9.75, 10.0, 10.25, 12.0, 20.0, 0.5], n, SEED + 3)
+    wac = draw(WACS, n, SEED + 4)
+    target_margin = draw(TARGET_MARGINS, n, SEED + 5)
+    store = margin_step_ladders(prices, wac, target_margin, ns['MAX_MARGIN_GAP_PCT'])
+    assert len(store) == n
+    for i in range(n):
+        expected = ns['expand_single_price_margin_steps'](prices[i], wac[i], target_margin[i])
+        assert store.ladder(i) == expected, f'row {i}: price={prices[i]}, wac={wac[i]}, tm={target_margin[i]}'
+
+
+def test_next_above_below_match_scalar_search(ladders):
+    store = TierStore.from_lists(ladders)
+    prices = draw([6.0, 9.0, 10.0, 10.1, 12.25, 15.75, 17.0, np.nan], N_ROWS, SEED + 6)
+    above = store.next_above(prices, min_gap=0.25)
+    below = store.next_below(prices, min_gap=0.25)
+    for i, ladder in enumerate(ladders):
+        up = [t for t in sorted(ladder) if t > prices[i] + 0.25]
+        down = [t for t in sorted(ladder) if t < prices[i] - 0.25]
+        np.testing.assert_equal(above[i], up[0] if up else np.nan)
+        np.testing.assert_equal(below[i], down[-1] if down else np.nan)
+        assert store.contains([prices[i]], rows=[i])[0] == (prices[i] in ladder)
+
+
+def test_parquet_round_trip(tmp_path, ladders):
+    path = str(tmp_path / 'exports' / 'effective_tiers.parquet')
+    df = pd.DataFrame({
+        'product_id': np.arange(N_ROWS) % 50 + 1,
+        'warehouse_id': np.arange(N_ROWS) // 50 + 1,
+        'effective_tiers': [sorted(ladder) for ladder in ladders],
+        'wac_p': draw(WACS, N_ROWS, SEED + 7),
+    })
+    first, second = df.iloc[:150], df.iloc[150:].reset_index(drop=True)
+    with TierParquetWriter(path) as writer:
+        writer.write(first)
+        writer.write(second, stores={'effective_tiers': TierStore.from_frame(second, key_columns=None)})
+        assert not os.path.exists(path)          # only the temp file while open
+    assert writer.rows == N_ROWS
+    assert os.path.exists(path) and not os.path.exists(f'{path}.tmp')
+
+    df_read, store = read_tier_parquet(path)
+    assert list(df_read.columns) == ['product_id', 'warehouse_id', 'wac_p', 'effective_tiers']
+    pd.testing.assert_frame_equal(df_read[df.columns], df)
+    assert df_read['effective_tiers'].tolist() == df['effective_tiers'].tolist()
+    expected = TierStore.from_frame(df)
+    np.testing.assert_array_equal(store.values, expected.values)
+    np.testing.assert_array_equal(store.offsets, expected.offsets)
+    assert store.keys.equals(expected.keys)
+
+    df_cols, store_cols = read_tier_parquet(path, columns=['product_id'], as_lists=False)
+    assert list(df_cols.columns) == ['product_id']
+    assert store_cols.keys is None
+    assert store_cols.to_lists() == df['effective_tiers'].tolist()
+
+
+def test_parquet_writer_abort_leaves_no_file(tmp_path):
+    path = str(tmp_path / 'effective_tiers.parquet')
+    df = pd.DataFrame({'product_id': [1], 'warehouse_id': [1], 'effective_tiers': [[9.0, 10.0]]})
+    with pytest.raises(RuntimeError):
+        with TierParquetWriter(path) as writer:
+            writer.write(df)
+            raise RuntimeError('export failed')
+    assert not os.path.exists(path) and not os.path.exists(f'{path}.tmp')
+
+
+def test_apply_market_max_ceiling():
+    df = pd.DataFrame({
+        'effective_tiers': [[9.0, 11.0], [11.0, 9.0], [9.0, 11.0], [], [9.0, 11.0], [9.0, 11.0], [9.0, 11.0]],
+        'new_price': [12.0, 11.5, np.nan, 50.0, 10.0, 12.0, np.nan],
+        'current_price': [10.0, 10.0, 13.0, 10.0, 10.0, 10.0, 10.5],
+        'price_action': ['increase', 'increase', 'hold', 'increase', 'increase', 'increase', 'hold'],
+        'reason': ['growing fast', None, None, 'x', 'y', 'z', 'w'],
+    })
+    growing = np.array([False, False, False, False, False, True, False])
+    out, n_new, n_current = apply_market_max_ceiling(df.copy(), growing, 'reason')
+
+    assert (n_new, n_current) == (2, 1)
+    np.testing.assert_array_equal(out['new_price'], [11.0, 11.0, 11.0, 50.0, 10.0, 12.0, np.nan])
+    assert out['reason'].tolist() == [
+        'growing fast | capped at market max (12.00 -> 11.00)',
+        'capped at market max (11.50 -> 11.00)',
+        'current price above market max (13.00 -> 11.00)',
+        'x', 'y', 'z', 'w',
+    ]
+    assert out['price_action'].tolist() == ['increase', 'increase', 'market_max_cap', 'increase',
+                                            'increase', 'increase', 'hold']
+
+    out, n_new, n_current = apply_market_max_ceiling(df.copy(), growing, 'reason', annotate_capped=False)
+    assert (n_new, n_current) == (2, 1)
+    assert out.loc[0, 'reason'] == 'growing fast' and pd.isna(out.loc[1, 'reason'])
+    assert out.loc[0, 'new_price'] == 11.0
@@ -0,0 +1,549 @@
+"""
+Columnar (CSR-style) store for per-SKU price ladders.
+
+Modules keep ``effective_tiers`` / ``price_tiers`` / ``margin_tier_prices`` as
+Python lists in object columns and step through them with per-row loops
+(find_next_price_above / find_next_price_below / find_price_n_steps_below /
+max(tiers)). TierStore packs all ladders of a frame into one flat float array
+with an offsets array (row i owns ``values[offsets[i]:offsets[i + 1]]``,
+sorted ascending), so tier stepping for the whole catalogue is one
+``np.searchsorted`` call.
+
+Comparisons are exact: every value and threshold is mapped to its rank among
+the distinct tier values, and the search runs on integer keys
+``row * stride + rank``, so ``tier > price + 0.25`` gives the same answer as
+the scalar loops (no float offset tricks).
+
+Usage in notebooks:
+    import sys, os
+    sys.path.insert(0, os.path.abspath('..'))  # if running from modules/
+    from tier_store import TierStore
+
+    store = TierStore.from_frame(df, 'effective_tiers')
+    up = store.next_above(df['current_price'], min_gap=0.25)   # NaN where no tier
+    top = store.max_tier()
+
+Ladder generation (subdivide_ladders / margin_step_ladders /
+inject_margin_anchors) works on the same flat arrays and returns a new
+TierStore, so V2 tier building and effective_tiers_export share one batch
+path instead of per-row list loops.
+
+Ladders are persisted as list<double> Parquet columns (TierParquetWriter /
+read_tier_parquet): the values and offsets map straight onto a TierStore,
+so readers never parse stringified lists.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from grouped_quantiles import segment_percentiles
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+TIER_KEY_COLUMNS = ('product_id', 'warehouse_id')
+
+# effective_tiers_export output (list-typed Parquet)
+TIERS_EXPORT_DIR = os.environ.get(
+    'PRICING_TIERS_DIR', os.path.join(tempfile.gettempdir(), 'pricing_tiers')
+)
+EFFECTIVE_TIERS_PATH = os.path.join(TIERS_EXPORT_DIR, 'effective_tiers_export.parquet')
+
+
+class TierStore:
+    """
+    All tier ladders of a frame as (values, offsets).
+
+    values:  float64, each row's ladder sorted ascending, NaNs dropped
+    offsets: int64, len(rows) + 1
+    keys:    optional MultiIndex of TIER_KEY_COLUMNS, one entry per row
+    """
+
+    def __init__(self, values, offsets, keys=None):
+        self.values = np.asarray(values, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.keys = keys
+        self.lengths = np.diff(self.offsets)
+        self._rounded = {}
+        # Integer search keys (see module docstring)
+        self._distinct = np.unique(self.values)
+        self._stride = 2 * len(self._distinct) + 2
+        self._row_of_value = np.repeat(np.arange(len(self.lengths), dtype=np.int64), self.lengths)
+        self._codes = self._row_of_value * self._stride + 2 * np.searchsorted(self._distinct, self.values) + 1
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_lists(cls, ladders, keys=None):
+        """Build from an iterable of lists (non-lists / NaNs count as empty)."""
+        cleaned = []
+        for ladder in ladders:
+            if isinstance(ladder, (list, tuple, np.ndarray)) and len(ladder) > 0:
+                arr = np.asarray(ladder, dtype=float)
+                cleaned.append(np.sort(arr[~np.isnan(arr)]))
+            else:
+                cleaned.append(np.empty(0))
+        lengths = np.fromiter((len(a) for a in cleaned), dtype=np.int64, count=len(cleaned))
+        offsets = np.zeros(len(cleaned) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        values = np.concatenate(cleaned) if cleaned else np.empty(0)
+        return cls(values, offsets, keys=keys)
+
+    @classmethod
+    def from_frame(cls, df, column='effective_tiers', key_columns=TIER_KEY_COLUMNS):
+        """Build from a DataFrame list column; rows follow df's row order."""
+        keys = None
+        if key_columns and all(c in df.columns for c in key_columns):
+            keys = pd.MultiIndex.from_frame(df[list(key_columns)])
+        return cls.from_lists(df[column].tolist(), keys=keys)
+
+    @classmethod
+    def from_flat(cls, values, rows, n, keys=None):
+        """Build from flat (value, row id) pairs: each row's values are sorted
+        and de-duplicated (sorted(set(...))), NaNs dropped, rows without
+        values are empty."""
+        values = np.asarray(values, dtype=float)
+        rows = np.asarray(rows, dtype=np.int64)
+        keep = ~np.isnan(values)
+        values, rows = values[keep], rows[keep]
+        order = np.lexsort((values, rows))
+        values, rows = values[order], rows[order]
+        first = np.ones(len(values), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (values[1:] != values[:-1])
+        values, rows = values[first], rows[first]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+        return cls(values, offsets, keys=keys)
+
+    @classmethod
+    def from_arrow(cls, array, keys=None):
+        """Build from a pyarrow list<double> array / chunked array whose
+        lists are already sorted (as written by TierParquetWriter); nulls
+        count as empty."""
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks() if array.num_chunks else pa.array([], pa.list_(pa.float64()))
+        offsets = np.asarray(array.offsets, dtype=np.int64)
+        values = np.asarray(array.values.to_numpy(zero_copy_only=False), dtype=float)
+        values = values[offsets[0]:offsets[-1]]
+        offsets = offsets - offsets[0]
+        return cls(values, offsets, keys=keys)
+
+    def to_arrow(self):
+        """Ladders as a pyarrow list<double> array (no per-row Python lists)."""
+        return pa.ListArray.from_arrays(pa.array(self.offsets.astype(np.int32)), pa.array(self.values))
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def ladder(self, row):
+        """One row's ladder as a Python list."""
+        return self.values[self.offsets[row]:self.offsets[row + 1]].tolist()
+
+    def to_lists(self):
+        return [self.ladder(i) for i in range(len(self))]
+
+    def take(self, rows):
+        """New store whose row i is this store's row ``rows[i]`` (empty where -1)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        safe = np.maximum(rows, 0)
+        lengths = np.where(rows >= 0, self.lengths[safe] if len(self) else 0, 0)
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        starts = np.where(rows >= 0, self.offsets[:-1][safe] if len(self) else 0, 0)
+        idx = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return TierStore(self.values[idx], offsets)
+
+    def positions(self, frame, key_columns=TIER_KEY_COLUMNS):
+        """Store rows for frame's (product_id, warehouse_id) keys (-1 where missing)."""
+        if self.keys is None:
+            raise ValueError("TierStore was built without keys")
+        targets = pd.MultiIndex.from_frame(frame[list(key_columns)])
+        return self.keys.get_indexer(targets)
+
+    # ------------------------------------------------------------------
+    # Vector operations (one value per row unless rows= is given)
+    # ------------------------------------------------------------------
+    def _rows(self, rows, n):
+        if rows is None:
+            return np.arange(len(self), dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) != n:
+            raise ValueError("rows and prices must have the same length")
+        return rows
+
+    def _threshold_codes(self, rows, thresholds):
+        """Integer keys for thresholds: odd = equal to a tier value, even = between."""
+        idx = np.searchsorted(self._distinct, thresholds, side='left')
+        equal = idx < len(self._distinct)
+        equal[equal] = self._distinct[idx[equal]] == thresholds[equal]
+        return rows * self._stride + 2 * idx + equal
+
+    def _values_at(self, pos, ok, rounded):
+        out = np.full(len(pos), np.nan)
+        source = self.rounded(rounded) if rounded is not None else self.values
+        out[ok] = source[pos[ok]]
+        return out
+
+    def next_above(self, prices, min_gap=0.0, rows=None, rounded=None):
+        """First tier strictly above ``price + min_gap`` per row (NaN if none)."""
+        prices = np.asarray(prices, dtype=float)
+        rows = self._rows(rows, len(prices))
+        thresholds = prices + min_gap
+        valid = (rows >= 0) & ~np.isnan(thresholds)
+        safe_rows = np.where(valid, rows, 0)
+        codes = self._threshold_codes(safe_rows, np.where(valid, thresholds, 0.0))
+        pos = np.searchsorted(self._codes, codes, side='right')
+        ok = valid & (pos < self.offsets[safe_rows + 1])
+        return self._values_at(pos, ok, rounded)
+
+    def next_below(self, prices, min_gap=0.0, rows=None, rounded=None):
+        """Last tier strictly below ``price - min_gap`` per row (NaN if none)."""
+        prices = np.asarray(prices, dtype=float)
+        rows = self._rows(rows, len(prices))
+        thresholds = prices - min_gap
+        valid = (rows >= 0) & ~np.isnan(thresholds)
+        safe_rows = np.where(valid, rows, 0)
+        codes = self._threshold_codes(safe_rows, np.where(valid, thresholds, 0.0))
+        pos = np.searchsorted(self._codes, codes, side='left') - 1
+        ok = valid & (pos >= self.offsets[safe_rows])
+        return self._values_at(pos, ok, rounded)
+
+    def n_steps_above(self, prices, n, min_gap=0.0, rows=None, rounded=None):
+        """Walk up ``n`` tiers from price; rows stop where no tier is left.
+        Returns the reached price (== price where not even one step exists)."""
+        price = np.asarray(prices, dtype=float).copy()
+        for _ in range(n):
+            step = self.next_above(price, min_gap, rows=rows, rounded=rounded)
+            moved = ~np.isnan(step) & (step > price)
+            if not moved.any():
+                break
+            price = np.where(moved, step, price)
+        return price
+
+    def n_steps_below(self, prices, n, min_gap=0.0, rows=None, rounded=None):
+        """Walk down ``n`` tiers from price (find_price_n_steps_below for all rows)."""
+        price = np.asarray(prices, dtype=float).copy()
+        for _ in range(n):
+            step = self.next_below(price, min_gap, rows=rows, rounded=rounded)
+            moved = ~np.isnan(step) & (step < price)
+            if not moved.any():
+                break
+            price = np.where(moved, step, price)
+        return price
+
+    def contains(self, prices, rows=None):
+        """Whether each price is exactly one of its row's tiers (``p in ladder``)."""
+        prices = np.asarray(prices, dtype=float)
+        rows = self._rows(rows, len(prices))
+        valid = (rows >= 0) & ~np.isnan(prices)
+        safe_rows = np.where(valid, rows, 0)
+        if len(self._codes) == 0:
+            return np.zeros(len(prices), dtype=bool)
+        codes = self._threshold_codes(safe_rows, np.where(valid, prices, 0.0))
+        pos = np.minimum(np.searchsorted(self._codes, codes, side='left'), len(self._codes) - 1)
+        return valid & (codes % 2 == 1) & (self._codes[pos] == codes)
+
+    def quarter_rounded(self):
+        """New store with every tier rounded to 0.25 and de-duplicated
+        (sorted(set(round(p * 4) / 4 for p in ladder)) for all rows)."""
+        return TierStore.from_flat(np.rint(self.values * 4) / 4, self._row_of_value, len(self), keys=self.keys)
+
+    def max_tier(self, rows=None):
+        """Top of each ladder (NaN for empty ladders)."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        ok = (rows >= 0) & (self.lengths[np.maximum(rows, 0)] > 0)
+        out = np.full(len(rows), np.nan)
+        out[ok] = self.values[self.offsets[rows[ok] + 1] - 1]
+        return out
+
+    def min_tier(self, rows=None):
+        """Bottom of each ladder (NaN for empty ladders)."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        ok = (rows >= 0) & (self.lengths[np.maximum(rows, 0)] > 0)
+        out = np.full(len(rows), np.nan)
+        out[ok] = self.values[self.offsets[rows[ok]]]
+        return out
+
+    def percentile(self, q):
+        """Per-row np.percentile(ladder, q) with linear interpolation
+        (q scalar or one per row); NaN for empty ladders."""
+        return segment_percentiles(self.values, self.offsets, q)
+
+    def mean_margin_steps(self, wac):
+        """Per-row mean margin step over the distinct tiers above wac
+        (the modules' _calc_avg_margin_step); NaN where wac <= 0 / NaN or
+        fewer than two tiers are above it."""
+        wac = np.broadcast_to(np.asarray(wac, dtype=float), (len(self),))
+        rows = self._row_of_value
+        values = self.values
+        with np.errstate(invalid='ignore'):
+            keep = (wac[rows] > 0) & (values > wac[rows])
+        keep[1:] &= ~((rows[1:] == rows[:-1]) & (values[1:] == values[:-1]))  # set()
+        rows, values = rows[keep], values[keep]
+        margins = (values - wac[rows]) / values
+        pair = rows[1:] == rows[:-1]
+        return segment_means((margins[1:] - margins[:-1])[pair], rows[1:][pair], len(self))
+
+    def rounded(self, decimals=2):
+        """values with Python round(v, decimals) (what the scalar helpers return), cached."""
+        if decimals not in self._rounded:
+            self._rounded[decimals] = np.array([round(v, decimals) for v in self.values.tolist()], dtype=float)
+        return self._rounded[decimals]
+
+
+def segment_means(values, rows, n):
+    """
+    Mean of values per row id (rows sorted ascending), NaN for rows without
+    values. Bit-identical to np.mean() on each row's list: short segments are
+    summed left to right like numpy does, longer ones call np.mean directly.
+    """
+    values = np.asarray(values, dtype=float)
+    counts = np.bincount(rows, minlength=n)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    out = np.full(n, np.nan)
+    total = np.zeros(n)
+    short = (counts > 0) & (counts < 8)
+    for k in range(7):
+        take = short & (counts > k)
+        total[take] += values[starts[take] + k]
+    out[short] = total[short] / counts[short]
+    for i in np.flatnonzero(counts >= 8):
+        out[i] = np.mean(values[starts[i]:starts[i] + counts[i]])
+    return out
+
+
+# ----------------------------------------------------------------------
+# Ladder generation kernels (market_data_module_2 / effective_tiers_export)
+# ----------------------------------------------------------------------
+def subdivide_ladders(store, wac, target_margin, max_gap_pct):
+    """
+    subdivide_price_list for every row: between adjacent tiers whose margin
+    gap exceeds ``max_gap_pct * target_margin``, insert ceil(gap / max_gap) - 1
+    evenly spaced margins as prices rounded to 0.25. Tiers at or below wac
+    are kept as-is; rows with wac <= 0, target_margin <= 0 or fewer than two
+    tiers are unchanged. Returns a new TierStore.
+    """
+    n = len(store)
+    wac = np.broadcast_to(np.asarray(wac, dtype=float), (n,))
+    target_margin = np.broadcast_to(np.asarray(target_margin, dtype=float), (n,))
+    rows = store._row_of_value
+    values = store.values
+
+    # Adjacent pairs (lo, hi) within a row
+    pair = np.zeros(len(values), dtype=bool)
+    pair[1:] = rows[1:] == rows[:-1]
+    hi_idx = np.flatnonzero(pair)
+    pair_rows = rows[hi_idx]
+    p_lo, p_hi = values[hi_idx - 1], values[hi_idx]
+    w, tm = wac[pair_rows], target_margin[pair_rows]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        active = ~(w <= 0) & ~(tm <= 0) & ~(p_hi <= w)
+        max_gap = max_gap_pct * tm
+        m_lo = np.where(p_lo > w, np.maximum((p_lo - w) / p_lo, 0), 0.0)
+        m_hi = (p_hi - w) / p_hi
+        gap = m_hi - m_lo
+        split = active & (gap > max_gap)
+        n_steps = np.where(split, np.ceil(gap / max_gap), 1).astype(np.int64)
+        margin_step = gap / n_steps
+
+    # One entry per inserted margin: s = 1 .. n_steps - 1 of its pair
+    n_mid = n_steps - 1
+    mid_pair = np.repeat(np.arange(len(hi_idx)), n_mid)
+    s = np.arange(len(mid_pair)) - np.repeat(np.cumsum(n_mid) - n_mid, n_mid) + 1
+    mid_margin = m_lo[mid_pair] + s * margin_step[mid_pair]
+    ok = (mid_margin > 0) & (mid_margin < 1)
+    mid_pair, mid_margin = mid_pair[ok], mid_margin[ok]
+    mid_price = np.rint(w[mid_pair] / (1 - mid_margin) * 4) / 4
+
+    return TierStore.from_flat(np.concatenate([values, mid_price]),
+                               np.concatenate([rows, pair_rows[mid_pair]]), n, keys=store.keys)
+
+
+def margin_step_ladders(prices, wac, target_margin, max_gap_pct, steps=2):
+    """
+    expand_single_price_margin_steps for every row: the anchor price plus up
+    to ``steps`` margin steps (``max_gap_pct * target_margin``, 0.03 when
+    target_margin <= 0) below and above it, rounded to 0.25 and kept within
+    0 < margin < 0.99. Rows with wac <= 0 or price <= wac keep only the
+    anchor. Returns a TierStore with one row per price.
+    """
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    wac = np.broadcast_to(np.asarray(wac, dtype=float), (n,))
+    target_margin = np.broadcast_to(np.asarray(target_margin, dtype=float), (n,))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eligible = ~(wac <= 0) & ~(prices <= wac)
+        margin_at_price = (prices - wac) / prices
+        step = np.where(target_margin > 0, target_margin * max_gap_pct, 0.03)
+        offsets = np.arange(-steps, steps + 1)
+        margins = margin_at_price[:, None] + offsets[None, :] * step[:, None]
+        ok = eligible[:, None] & (margins > 0) & (margins < 0.99)
+        stepped = np.rint(wac[:, None] / (1 - margins) * 4) / 4
+    row_ids = np.broadcast_to(np.arange(n)[:, None], margins.shape)
+    return TierStore.from_flat(np.concatenate([prices, stepped[ok]]),
+                               np.concatenate([np.arange(n), row_ids[ok]]), n)
+
+
+def inject_margin_anchors(store, wac, margins, eligible=None, min_wac_ratio=0.9):
+    """
+    Add the price ``round(wac / (1 - margin) * 4) / 4`` to each eligible row
+    where wac > 0, 0 < margin < 1, the price is >= ``min_wac_ratio * wac``
+    and not already a tier. Returns (new TierStore, injected mask).
+    """
+    n = len(store)
+    wac = np.broadcast_to(np.asarray(wac, dtype=float), (n,))
+    margins = np.broadcast_to(np.asarray(margins, dtype=float), (n,))
+    eligible = np.ones(n, dtype=bool) if eligible is None else np.asarray(eligible, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        anchor = np.rint(wac / (1 - margins) * 4) / 4
+        candidate = eligible & (wac > 0) & (margins > 0) & (margins < 1) & (anchor >= min_wac_ratio * wac)
+    injected = candidate & ~store.contains(np.where(candidate, anchor, np.nan))
+    if not injected.any():
+        return store, injected
+    rows = np.flatnonzero(injected)
+    new_store = TierStore.from_flat(np.concatenate([store.values, anchor[rows]]),
+                                    np.concatenate([store._row_of_value, rows]), n, keys=store.keys)
+    return new_store, injected
+
+
+# ----------------------------------------------------------------------
+# List-typed Parquet I/O
+# ----------------------------------------------------------------------
+class TierParquetWriter:
+    """
+    Streams frames into one Parquet file, one row group per write(), with
+    tier columns stored as list<double>. The file is written to a temp path
+    and moved into place on close(), so readers never see a partial export.
+
+        with TierParquetWriter(EFFECTIVE_TIERS_PATH) as writer:
+            for chunk, store in chunks:
+                writer.write(chunk, stores={'effective_tiers': store})
+    """
+
+    def __init__(self, path, tier_columns=('effective_tiers',)):
+        if not ARROW_AVAILABLE:
+            raise ImportError("pyarrow is required to write tier Parquet files")
+        self.path = path
+        self.tier_columns = tuple(tier_columns)
+        self.rows = 0
+        self._tmp_path = f"{path}.tmp"
+        self._writer = None
+        self._schema = None
+
+    def write(self, df, stores=None):
+        """Append df; ``stores`` may pass a prebuilt TierStore per tier column
+        (otherwise the column's lists are packed here)."""
+        stores = stores or {}
+        arrays, names = [], []
+        for col in df.columns:
+            if col in self.tier_columns:
+                store = stores.get(col)
+                if store is None:
+                    store = TierStore.from_frame(df, col, key_columns=None)
+                arrays.append(store.to_arrow())
+            else:
+                arrays.append(pa.Array.from_pandas(df[col]))
+            names.append(col)
+        table = pa.Table.from_arrays(arrays, names=names)
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._schema = table.schema
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema)
+        else:
+            table = table.cast(self._schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self._tmp_path, self.path)
+            self._writer = None
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def read_tier_parquet(path=EFFECTIVE_TIERS_PATH, column='effective_tiers', columns=None, as_lists=True):
+    """
+    Read a list-typed tier Parquet file. Returns (df, store): the TierStore is
+    built straight from the Arrow offsets/values (keyed on TIER_KEY_COLUMNS
+    when present); with ``as_lists`` df[column] also holds Python lists for
+    row-wise consumers.
+    """
+    if not ARROW_AVAILABLE:
+        raise ImportError("pyarrow is required to read tier Parquet files")
+    if columns is not None and column not in columns:
+        columns = list(columns) + [column]
+    table = pq.read_table(path, columns=columns)
+    df = table.drop([column]).to_pandas()
+    keys = None
+    if all(c in df.columns for c in TIER_KEY_COLUMNS):
+        keys = pd.MultiIndex.from_frame(df[list(TIER_KEY_COLUMNS)])
+    store = TierStore.from_arrow(table[column], keys=keys)
+    if as_lists:
+        df[column] = store.to_lists()
+    return df, store
+
+
+def apply_market_max_ceiling(df, growing, reason_col, store=None, tier_column='effective_tiers',
+                             annotate_capped=True):
+    """
+    Cap prices at max(effective_tiers) for non-growing SKUs (vector form of
+    the per-row ceiling loop in Modules 2-4).
+
+    A row with a new_price above market max is capped (and, with
+    annotate_capped, gets " | capped at market max (new -> max)" appended to
+    reason_col); a row
+    without new_price whose current_price is above market max gets
+    new_price = market max and price_action 'market_max_cap'.
+
+    Returns (df, n_new_capped, n_current_capped).
+    """
+    store = store or TierStore.from_frame(df, tier_column, key_columns=None)
+    market_max = store.max_tier()
+    new = pd.to_numeric(df['new_price'], errors='coerce').to_numpy(dtype=float)
+    cur = pd.to_numeric(df['current_price'], errors='coerce').to_numpy(dtype=float)
+    check = np.where(np.isnan(new), cur, new)
+    with np.errstate(invalid='ignore'):
+        over = ~np.asarray(growing, dtype=bool) & ~np.isnan(market_max) & (check > market_max)
+    cap_new = over & ~np.isnan(new)
+    cap_cur = over & np.isnan(new)
+
+    def _fmt(values):
+        return pd.Series(values, index=df.index).map(lambda v: f'{v:.2f}')
+
+    mm_str = _fmt(market_max)
+    old_reason = df[reason_col].where(df[reason_col].notna(), '').astype(str)
+    capped = 'capped at market max (' + _fmt(new) + ' -> ' + mm_str + ')'
+    capped_reason = np.where(old_reason != '', old_reason + ' | ' + capped, capped)
+    current_reason = 'current price above market max (' + _fmt(cur) + ' -> ' + mm_str + ')'
+
+    df.loc[over, 'new_price'] = market_max[over]
+    if annotate_capped:
+        df.loc[cap_new, reason_col] = capped_reason[cap_new]
+    df.loc[cap_cur, 'price_action'] = 'market_max_cap'
+    df.loc[cap_cur, reason_col] = current_reason[cap_cur]
+    return df, int(cap_new.sum()), int(cap_cur.sum())